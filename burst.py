@@ -0,0 +1,143 @@
+import logging
+import time
+from typing import Callable, Dict, List, Tuple, Union
+
+from influxdb_client_3 import Point
+from pymodbus.exceptions import ModbusIOException
+
+from config import MonitorConfig
+from control import ControlConflictError
+from influxdb import InfluxDBHandler
+from register_map import REGISTER_MAP, Value, plan_blocks
+from sun2000 import RegisterData, Sun2000, Sun2000NotConnectedError, Sun2000ShortReadError
+
+logger = logging.getLogger(__name__)
+
+GRID_NOMINAL_FREQUENCY_HZ = 50.0
+
+BURST_REGISTERS = [
+    "meter_a_phase_voltage",
+    "meter_b_phase_voltage",
+    "meter_c_phase_voltage",
+    "meter_a_phase_current",
+    "meter_b_phase_current",
+    "meter_c_phase_current",
+    "meter_grid_frequency",
+    "meter_a_phase_active_power",
+    "meter_b_phase_active_power",
+    "meter_c_phase_active_power",
+]
+
+# (time in ns, values in BURST_REGISTERS order)
+Sample = Tuple[int, Tuple[Value, ...]]
+
+
+class BurstCapture:
+    """
+    Polls only the grid/meter registers, back to back, for a bounded duration.
+    Normal polling is paused while a burst runs; the samples are kept in memory
+    and written as a single batch once the burst ends.
+    """
+    def __init__(self, config:MonitorConfig)->None:
+        self.config = config
+        self.blocks = plan_blocks([REGISTER_MAP[name] for name in BURST_REGISTERS])
+        # a plain flag rather than a threading.Event, as request() also runs in a signal handler
+        self.requested = False
+        self.trigger = None
+        self.duration_seconds = config.burst_duration_seconds
+        self.last_threshold_burst = None
+
+    def request(self, trigger:str, duration_seconds:Union[int, None]=None)->bool:
+        """False, and nothing changes, while a burst is already pending or running."""
+        if self.requested:
+            return False
+        self.trigger = trigger
+        self.duration_seconds = duration_seconds or self.config.burst_duration_seconds
+        self.requested = True
+        return True
+
+    def on_signal(self, signum, frame)->None:
+        self.request(trigger='signal')
+
+    def pending(self)->bool:
+        return self.requested
+
+    def handle_request(self, params:Dict[str, str])->dict:
+        duration_seconds = int(params.get('duration', self.config.burst_duration_seconds))
+        if duration_seconds <= 0:
+            raise ValueError('duration must be positive')
+        if duration_seconds > self.config.burst_max_duration_seconds:
+            raise ValueError(f'duration must be at most {self.config.burst_max_duration_seconds} seconds')
+        if not self.request(trigger='endpoint', duration_seconds=duration_seconds):
+            raise ControlConflictError(f'a {self.duration_seconds} s burst capture ({self.trigger}) is already in progress')
+        return {'burst': 'requested', 'duration_seconds': duration_seconds}
+
+    def check_thresholds(self, polled:Dict[str, RegisterData])->None:
+        now = time.monotonic()
+        if self.last_threshold_burst is not None and now - self.last_threshold_burst < self.config.burst_cooldown_seconds:
+            return
+
+        phase_powers = [polled[name].value for name in ("meter_a_phase_active_power", "meter_b_phase_active_power", "meter_c_phase_active_power") if name in polled]
+        frequency = polled["meter_grid_frequency"].value if "meter_grid_frequency" in polled else None
+
+        if self.config.burst_phase_imbalance_watts and None not in phase_powers and len(phase_powers) == 3:
+            imbalance = max(phase_powers) - min(phase_powers)
+            if imbalance > self.config.burst_phase_imbalance_watts:
+                logger.info(f'Phase imbalance {imbalance} W above {self.config.burst_phase_imbalance_watts} W')
+                self.last_threshold_burst = now
+                self.request(trigger='phase_imbalance')
+                return
+
+        if self.config.burst_frequency_deviation_hz and frequency is not None:
+            deviation = abs(frequency - GRID_NOMINAL_FREQUENCY_HZ)
+            if deviation > self.config.burst_frequency_deviation_hz:
+                logger.info(f'Grid frequency {frequency} Hz deviates more than {self.config.burst_frequency_deviation_hz} Hz')
+                self.last_threshold_burst = now
+                self.request(trigger='frequency_deviation')
+
+    def capture(self, sun2000_client:Sun2000, duration_seconds:int, stop:Callable[[], bool])->List[Sample]:
+        samples: List[Sample] = []
+        deadline = time.monotonic() + duration_seconds
+        while time.monotonic() < deadline:
+            if stop():
+                logger.info('Burst capture stopped early for shutdown')
+                break
+            t = time.time_ns()
+            values = {}
+            try:
+                for block in self.blocks:
+                    values.update(sun2000_client.read_block(block))
+            except (ModbusIOException, Sun2000NotConnectedError, Sun2000ShortReadError) as e:
+                logger.error(f'Burst capture stopped early: {e}')
+                break
+            samples.append((t, tuple(values[name] for name in BURST_REGISTERS)))
+        return samples
+
+    def write(self, influxdb_handler:InfluxDBHandler, samples:List[Sample], trigger:str)->None:
+        points = []
+        for t, values in samples:
+            point = Point(self.config.influxdb_table_burst).tag('source', 'meter').tag('trigger', trigger).time(t)
+            for name, value in zip(BURST_REGISTERS, values):
+                if value is not None:
+                    point.field(name, value)
+            points.append(point)
+        influxdb_handler.client.write(points)
+
+    def run(self, sun2000_client:Sun2000, influxdb_handler:InfluxDBHandler, stop:Callable[[], bool])->None:
+        """Capture and write one burst. `stop` ends the capture early (eg. on SIGTERM); what was sampled is still written."""
+        trigger, duration_seconds = self.trigger, self.duration_seconds
+        logger.info(f'Starting {duration_seconds} s burst capture (trigger: {trigger})')
+        started = time.monotonic()
+        samples = self.capture(sun2000_client=sun2000_client, duration_seconds=duration_seconds, stop=stop)
+        elapsed = time.monotonic() - started
+        self.requested = False
+        if not samples:
+            logger.warning('Burst capture collected no samples')
+            return
+        try:
+            self.write(influxdb_handler=influxdb_handler, samples=samples, trigger=trigger)
+        except Exception as e:
+            # like a failing sink, a failed burst write must not take the poll loop down
+            logger.error(f'Burst capture failed to write {len(samples)} samples to {self.config.influxdb_table_burst}: {e}')
+            return
+        logger.info(f'Burst capture wrote {len(samples)} samples ({len(samples) / elapsed:.1f} Hz) to {self.config.influxdb_table_burst}')
@@ -0,0 +1,34 @@
+import threading
+import time
+from datetime import datetime, tzinfo
+from typing import Callable
+
+# How often a wait checks whether it should end early.
+WAKE_CHECK_SECONDS = 0.5
+
+
+class Clock:
+    """
+    Wall clock of the poll loop. The soak test swaps in a simulated one to run weeks of
+    polling and rollups in minutes.
+    """
+    def __init__(self) -> None:
+        # never set; waiting on an Event keeps the idle poll loop out of the profiler's samples
+        self.idle = threading.Event()
+
+    def now(self, tz:tzinfo) -> datetime:
+        return datetime.now(tz)
+
+    def wait(self, until:Callable[[], bool], timeout:float) -> bool:
+        """
+        Wait up to timeout seconds, returning early once until() is true. The condition is
+        polled rather than signalled, as it may be set from a signal handler, which must
+        not touch the locks behind threading.Event.set().
+        """
+        deadline = time.monotonic() + timeout
+        while not until():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.idle.wait(timeout=min(remaining, WAKE_CHECK_SECONDS))
+        return True
@@ -6,24 +6,71 @@ class MonitorConfig:
     influxdb_token: str
     influxdb_host: str
     influxdb_port: int
+    influxdb_query_port: int
     sun2000_inverter_host: str
     sun2000_inverter_port: int
     influxdb_dbname: str
+    influxdb_table: str
     influxdb_dbname_daily: str
     influxdb_dbname_rollup_state: str
     polling_interval_seconds: int
+    influxdb_table_burst: str
+    burst_duration_seconds: int
+    burst_max_duration_seconds: int
+    burst_cooldown_seconds: int
+    burst_phase_imbalance_watts: int
+    burst_frequency_deviation_hz: float
+    control_host: str
+    control_port: int
+    sink_queue_size: int
+    sink_policy_influxdb: str
+    sink_policy_mqtt: str
+    sink_policy_file: str
+    mqtt_host: str
+    mqtt_port: int
+    mqtt_topic: str
+    file_sink_path: str
+    diagnostics_dir: str
+    profile_cycles: int
 
 def get_config():
     config = MonitorConfig(
         influxdb_token=os.environ.get('INFLUXDB_TOKEN'),
         influxdb_host=os.environ.get('INFLUXDB_HOST'),
         influxdb_port=int(os.environ.get('INFLUXDB_PORT', '8181')),
+        # Flight queries normally share the HTTP port
+        influxdb_query_port=int(os.environ.get('INFLUXDB_QUERY_PORT', os.environ.get('INFLUXDB_PORT', '8181'))),
         influxdb_dbname=os.environ.get('INFLUXDB_DBNAME', 'sun2000_monitoring'),
+        influxdb_table=os.environ.get('INFLUXDB_TABLE', 'sun2000_telemetry'),
         influxdb_dbname_daily=os.environ.get('INFLUXDB_DBNAME_DAILY', 'sun2000_monitoring_daily'),
         influxdb_dbname_rollup_state=os.environ.get('INFLUXDB_DBNAME_ROLLUP_STATE', 'sun2000_monitoring_rollup_state'),
         sun2000_inverter_host=os.environ.get('SUN2000_INVERTER_HOST'),
         sun2000_inverter_port=int(os.environ.get('SUN2000_INVERTER_PORT', '6607')),
-        polling_interval_seconds=int(os.environ.get('POLLING_INTERVAL_SECONDS', '60'))
+        polling_interval_seconds=int(os.environ.get('POLLING_INTERVAL_SECONDS', '60')),
+        influxdb_table_burst=os.environ.get('INFLUXDB_TABLE_BURST', 'sun2000_burst'),
+        burst_duration_seconds=int(os.environ.get('BURST_DURATION_SECONDS', '30')),
+        # longest burst the control endpoint accepts; polling is paused and samples held in memory meanwhile
+        burst_max_duration_seconds=int(os.environ.get('BURST_MAX_DURATION_SECONDS', '300')),
+        burst_cooldown_seconds=int(os.environ.get('BURST_COOLDOWN_SECONDS', '600')),
+        # 0 disables the threshold trigger
+        burst_phase_imbalance_watts=int(os.environ.get('BURST_PHASE_IMBALANCE_WATTS', '0')),
+        burst_frequency_deviation_hz=float(os.environ.get('BURST_FREQUENCY_DEVIATION_HZ', '0')),
+        control_host=os.environ.get('CONTROL_HOST', '127.0.0.1'),
+        # 0 disables the local control endpoint
+        control_port=int(os.environ.get('CONTROL_PORT', '0')),
+        sink_queue_size=int(os.environ.get('SINK_QUEUE_SIZE', '720')),
+        # what a sink does with a new cycle when its queue is full: drop_oldest, drop_newest or block (the poll loop, up to 1 s)
+        sink_policy_influxdb=os.environ.get('SINK_POLICY_INFLUXDB', 'drop_oldest'),
+        sink_policy_mqtt=os.environ.get('SINK_POLICY_MQTT', 'drop_oldest'),
+        sink_policy_file=os.environ.get('SINK_POLICY_FILE', 'drop_oldest'),
+        # empty disables MQTT publishing
+        mqtt_host=os.environ.get('MQTT_HOST', ''),
+        mqtt_port=int(os.environ.get('MQTT_PORT', '1883')),
+        mqtt_topic=os.environ.get('MQTT_TOPIC', 'sun2000'),
+        # empty disables the JSON lines file log
+        file_sink_path=os.environ.get('FILE_SINK_PATH', ''),
+        diagnostics_dir=os.environ.get('DIAGNOSTICS_DIR', 'diagnostics'),
+        profile_cycles=int(os.environ.get('PROFILE_CYCLES', '10'))
     )
     # Validate required fields
     for field in config.__dataclass_fields__.values():
@@ -0,0 +1,94 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+RouteHandler = Callable[[Dict[str, str]], dict]
+
+
+class ControlConflictError(Exception):
+    """Raised by a route handler when the command clashes with one already in progress; answered with 409."""
+
+
+class ControlServer:
+    """
+    Small local HTTP endpoint for runtime commands (POST, eg. `curl -X POST localhost:8090/burst?duration=30`)
+    and status queries (GET). Each route handler receives the query parameters and returns a JSON-serializable dict.
+    """
+    def __init__(self, host:str, port:int)->None:
+        self.routes: Dict[Tuple[str, str], RouteHandler] = {}
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.dispatch('GET', 200)
+
+            def do_POST(self):
+                self.dispatch('POST', 202)
+
+            def dispatch(self, method:str, status:int):
+                url = urlsplit(self.path)
+                route = routes.get((method, url.path))
+                if route is None:
+                    self.reply(404, {'error': f'unknown command {method} {url.path}'})
+                    return
+                try:
+                    self.reply(status, route(dict(parse_qsl(url.query))))
+                except ValueError as e:
+                    self.reply(400, {'error': str(e)})
+                except ControlConflictError as e:
+                    self.reply(409, {'error': str(e)})
+
+            def reply(self, status:int, body:dict):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    def add_route(self, path:str, handler:RouteHandler, method:str='POST')->None:
+        self.routes[(method, path)] = handler
+
+    def start(self)->None:
+        host, port = self.server.server_address[:2]
+        logger.info(f'Control endpoint listening on http://{host}:{port} ({", ".join(f"{method} {path}" for method, path in sorted(self.routes))})')
+        threading.Thread(target=self.server.serve_forever, name='control-server', daemon=True).start()
+
+
+def main():
+    # the monitor image has no curl: `docker exec monitor python control.py /burst?duration=60`
+    parser = argparse.ArgumentParser(description='Send a command to the control endpoint of the running monitor.')
+    parser.add_argument('path', help='command, eg. /burst?duration=60, /profile or /sinks')
+    parser.add_argument('-X', '--method', default='POST', choices=['GET', 'POST'], help='HTTP method (default POST; status queries use GET)')
+    args = parser.parse_args()
+
+    config = get_config()
+    if not config.control_port:
+        sys.exit('CONTROL_PORT is not set, the control endpoint is disabled')
+    host = '127.0.0.1' if config.control_host == '0.0.0.0' else config.control_host
+    request = urllib.request.Request(f'http://{host}:{config.control_port}{args.path}', method=args.method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            print(response.read().decode())
+    except urllib.error.HTTPError as e:
+        sys.exit(f'{e.code}: {e.read().decode()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL_SECONDS = 0.005
+TRACEMALLOC_FRAMES = 5
+TOP_STATS = 30
+# threads doing the monitor's work; the control server and the MQTT network loop idle in select(),
+# which looks busy from Python, so they are left out
+PROFILED_THREAD_PREFIX = 'sink-'
+
+
+def rss_kib() -> Union[int, None]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return None
+
+
+class StackSampler:
+    """
+    Sampling profiler over the poll loop and the sink worker threads. Unlike cProfile, which only
+    sees the thread that enabled it, this also covers the sink workers, where point construction
+    and writes happen. Threads parked in threading waits (idle workers, the poll loop between
+    cycles) are not counted.
+    """
+    def __init__(self, interval:float=SAMPLE_INTERVAL_SECONDS)->None:
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        # ticks where at least one thread was running; idle ticks would dilute the percentages
+        self.busy_samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+        self.started = None
+
+    def start(self)->None:
+        self.started = time.monotonic()
+        self.thread.start()
+
+    def stop(self)->float:
+        self.stopped.set()
+        self.thread.join()
+        return time.monotonic() - self.started
+
+    def run(self)->None:
+        names = {}
+        main_thread_id = threading.main_thread().ident
+        while not self.stopped.wait(self.interval):
+            self.samples += 1
+            busy = False
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                name = names.get(thread_id, str(thread_id))
+                if thread_id != main_thread_id and not name.startswith(PROFILED_THREAD_PREFIX):
+                    continue
+                if frame.f_code.co_name == 'wait' and frame.f_code.co_filename == threading.__file__:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[tuple(reversed(stack))] += 1
+                busy = True
+            if busy:
+                self.busy_samples += 1
+
+    def write(self, path_prefix:str, cycles:int, elapsed:float)->None:
+        # folded stacks, loadable by flamegraph.pl or speedscope
+        with open(f'{path_prefix}.folded', 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{";".join(stack)} {count}\n')
+
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for function in set(stack[1:]):
+                total_counts[function] += count
+        with open(f'{path_prefix}.txt', 'w') as f:
+            f.write(f'{cycles} poll cycles, {elapsed:.1f} s, {self.samples} samples every {self.interval * 1000:.0f} ms, '
+                    f'{self.busy_samples} busy ({self.busy_samples / max(self.samples, 1):.1%}); percentages are of busy samples\n\n')
+            f.write('Top functions by own samples:\n')
+            for function, count in self_counts.most_common(TOP_STATS):
+                f.write(f'{count:8d} {count / max(self.busy_samples, 1):7.1%}  {function}\n')
+            f.write('\nTop functions by cumulative samples:\n')
+            for function, count in total_counts.most_common(TOP_STATS):
+                f.write(f'{count:8d} {count / max(self.busy_samples, 1):7.1%}  {function}\n')
+
+
+class Diagnostics:
+    """
+    On-demand profiling and memory diagnostics. Nothing runs until requested; when idle the
+    poll loop only pays for the on_cycle() flag check.
+    """
+    def __init__(self, output_dir:str, profile_cycles:int)->None:
+        self.output_dir = output_dir
+        self.profile_cycles = profile_cycles
+        # requests only set flags, so they are safe from signal handlers and the control endpoint threads
+        self.profile_requested: Union[int, None] = None
+        self.snapshot_requested = False
+        self.snapshot_lock = threading.Lock()
+        self.sampler: Union[StackSampler, None] = None
+        self.cycles = 0
+        self.cycles_left = 0
+        self.snapshots: List[Tuple[str, tracemalloc.Snapshot]] = []
+        self.sequence = 0
+
+    def path(self, kind:str)->str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.sequence += 1
+        return os.path.join(self.output_dir, f'{kind}-{datetime.now().strftime("%Y%m%dT%H%M%S")}-{self.sequence}')
+
+    def request_profile(self, cycles:Union[int, None]=None)->None:
+        self.profile_requested = cycles or self.profile_cycles
+
+    def on_signal(self, signum, frame)->None:
+        self.request_profile()
+        self.snapshot_requested = True
+
+    def on_cycle(self)->None:
+        if self.profile_requested is None and self.sampler is None and not self.snapshot_requested:
+            return
+        if self.snapshot_requested:
+            self.snapshot_requested = False
+            self.take_snapshot()
+        if self.sampler is not None:
+            self.cycles_left -= 1
+            if self.cycles_left <= 0:
+                self.finish_profile()
+        cycles, self.profile_requested = self.profile_requested, None
+        if cycles is not None and self.sampler is None:
+            logger.info(f'Profiling the next {cycles} poll cycles')
+            self.cycles = self.cycles_left = cycles
+            self.sampler = StackSampler()
+            self.sampler.start()
+
+    def finish_profile(self)->None:
+        sampler, self.sampler = self.sampler, None
+        elapsed = sampler.stop()
+        path_prefix = self.path('profile')
+        sampler.write(path_prefix=path_prefix, cycles=self.cycles, elapsed=elapsed)
+        logger.info(f'Profile written to {path_prefix}.txt and {path_prefix}.folded')
+
+    def take_snapshot(self)->str:
+        """
+        Take a tracemalloc snapshot, starting tracing on first use, and write its top
+        allocations together with the growth since the previous and the first snapshot.
+        """
+        with self.snapshot_lock:
+            return self.write_snapshot()
+
+    def write_snapshot(self)->str:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.snapshots = []
+            logger.info('tracemalloc started; take another snapshot later to see memory growth')
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        taken = datetime.now().isoformat(timespec='seconds')
+        baselines = {}
+        if self.snapshots:
+            baselines['previous'] = self.snapshots[-1]
+        if len(self.snapshots) > 1:
+            baselines['first'] = self.snapshots[0]
+
+        path = f'{self.path("tracemalloc")}.txt'
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w') as f:
+            f.write(f'Snapshot at {taken}: traced {current / 1024:.0f} KiB (peak {peak / 1024:.0f} KiB), RSS {rss_kib()} KiB\n')
+            f.write('\nTop allocations:\n')
+            for stat in snapshot.statistics('lineno')[:TOP_STATS]:
+                f.write(f'{stat}\n')
+            for label, (baseline_taken, baseline) in baselines.items():
+                f.write(f'\nGrowth since {label} snapshot ({baseline_taken}):\n')
+                for stat in snapshot.compare_to(baseline, 'lineno')[:TOP_STATS]:
+                    f.write(f'{stat}\n')
+
+        # keep the first snapshot as the baseline and the latest for the next diff
+        self.snapshots = self.snapshots[:1] + [(taken, snapshot)]
+        logger.info(f'tracemalloc snapshot written to {path}')
+        return path
+
+    def stop_tracing(self)->None:
+        with self.snapshot_lock:
+            tracemalloc.stop()
+            self.snapshots = []
+        logger.info('tracemalloc stopped')
+
+    def handle_profile(self, params:Dict[str, str])->dict:
+        cycles = int(params.get('cycles', self.profile_cycles))
+        if cycles <= 0:
+            raise ValueError('cycles must be positive')
+        self.request_profile(cycles=cycles)
+        return {'profile': 'requested', 'cycles': cycles, 'output_dir': os.path.abspath(self.output_dir)}
+
+    def handle_snapshot(self, params:Dict[str, str])->dict:
+        return {'snapshot': self.take_snapshot()}
+
+    def handle_stop_tracing(self, params:Dict[str, str])->dict:
+        self.stop_tracing()
+        return {'tracemalloc': 'stopped'}
@@ -7,7 +7,11 @@ class InfluxDBHandler:
         self.client = InfluxDBClient3(
             host=f'http://{config.influxdb_host}:{config.influxdb_port}',
             token=config.influxdb_token,
-            database=config.influxdb_dbname
+            database=config.influxdb_dbname,
+            query_port_overwrite=config.influxdb_query_port,
+            # no gzip_threshold: influxdb3-python 0.16 fails every write when one is set (it calls
+            # .encode() on the already encoded body), so all writes are compressed
+            enable_gzip=True
         )
 
     def ping(self):
@@ -1,4 +1,4 @@
-import time
+import signal
 
 from datetime import datetime, timedelta, date, timezone
 from influxdb_client_3 import Point, InfluxDBError, InfluxDB3ClientQueryError
@@ -7,8 +7,13 @@ from pymodbus.exceptions import ModbusIOException
 from typing import Union
 from zoneinfo import ZoneInfo
 
+from burst import BurstCapture
+from clock import Clock
 from config import get_config
+from control import ControlServer
+from diagnostics import Diagnostics
 from influxdb import InfluxDBHandler
+from sinks import Cycle, InfluxDBSink, SinkWorker, SnapshotSink, build_pipeline
 from sun2000 import Sun2000, Sun2000NotConnectedError
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,6 +24,8 @@ UTC = timezone.utc
 ROLLOUT_HOUR_LOCAL = 0
 ROLLOUT_MINUTE_LOCAL = 1
 ROLLOUT_FORCE = False
+# how long the poll loop waits for queued telemetry to reach InfluxDB before a rollup; retried on the next cycle
+CLOCK = Clock()
 
 
 def get_last_rollup_time_utc(handler:InfluxDBHandler, rollup_type:str) -> Union[datetime, None]:
@@ -42,7 +49,7 @@ def last_rollup_utc_to_local(last_rollup_utc:Union[datetime, None]) -> date:
         last_rollup_local = last_rollup_utc.astimezone(LOCAL_TZ).date()
     else:
         # first run → roll up from first data day
-        last_rollup_local = datetime.now(LOCAL_TZ).date().replace(year=2025, month=12, day=20)
+        last_rollup_local = CLOCK.now(LOCAL_TZ).date().replace(year=2025, month=12, day=20)
     return last_rollup_local
 
 def get_days_to_rollup(last_rollup_day_local:date, latest_complete_day:date) -> list[date]:
@@ -54,10 +61,13 @@ def get_days_to_rollup(last_rollup_day_local:date, latest_complete_day:date) ->
     return days_to_rollup
 
 def get_latest_complete_day():
-    now_local = datetime.now(LOCAL_TZ)
+    now_local = CLOCK.now(LOCAL_TZ)
     latest_complete_day = now_local.date() - timedelta(days=1)
     return latest_complete_day
 
+def rollout_time_reached(now_local:datetime) -> bool:
+    return (now_local.hour, now_local.minute) >= (ROLLOUT_HOUR_LOCAL, ROLLOUT_MINUTE_LOCAL)
+
 def write_rollup_state(influxdb_handler:InfluxDBHandler, day_local:date, rollup_type:str) -> None:
     t_local = datetime.combine(day_local, datetime.min.time(), LOCAL_TZ)
     t_utc = t_local.astimezone(UTC)
@@ -101,7 +111,8 @@ def rollup_already_done(influxdb_handler:InfluxDBHandler, day_local:date, rollup
 
 def daily_rollup_energy_breakdown(influxdb_handler: InfluxDBHandler, rollout_day:date) -> bool:
     rollout_filter_start_utc = datetime.combine(rollout_day, datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
-    rollout_filter_end_utc = rollout_filter_start_utc + timedelta(days=1)
+    # local days are 23 or 25 hours long across DST changes
+    rollout_filter_end_utc = datetime.combine(rollout_day + timedelta(days=1), datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
     logger.debug(f"Rollout day: {rollout_day}")
     logger.debug(f"Rollout start utc: {rollout_filter_start_utc}")
     logger.debug(f"Rollout end utc: {rollout_filter_end_utc}")
@@ -116,7 +127,7 @@ def daily_rollup_energy_breakdown(influxdb_handler: InfluxDBHandler, rollout_day
       MAX(accumulated_energy_yield) - MIN(accumulated_energy_yield) AS pv_energy,
       MAX(meter_reverse_active_power) - MIN(meter_reverse_active_power) AS house_from_grid,
       MAX(meter_positive_active_electricity) - MIN(meter_positive_active_electricity) AS feed_in
-    FROM sun2000_monitoring
+    FROM {influxdb_handler.config.influxdb_table}
     WHERE time >= TIMESTAMP '{rollout_filter_start_utc.isoformat()}'
       AND time <  TIMESTAMP '{rollout_filter_end_utc.isoformat()}'
     """
@@ -157,7 +168,8 @@ def daily_rollup_energy_breakdown(influxdb_handler: InfluxDBHandler, rollout_day
 
 def daily_rollup_battery(influxdb_handler: InfluxDBHandler, rollout_day:date) -> bool:
     rollout_filter_start_utc = datetime.combine(rollout_day, datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
-    rollout_filter_end_utc = rollout_filter_start_utc + timedelta(days=1)
+    # local days are 23 or 25 hours long across DST changes
+    rollout_filter_end_utc = datetime.combine(rollout_day + timedelta(days=1), datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
     logger.debug(f"Rollout day: {rollout_day}")
     logger.debug(f"Rollout start utc: {rollout_filter_start_utc}")
     logger.debug(f"Rollout end utc: {rollout_filter_end_utc}")
@@ -176,7 +188,7 @@ def daily_rollup_battery(influxdb_handler: InfluxDBHandler, rollout_day:date) ->
           MAX(battery_soc) AS battery_soc_max,
           AVG(battery_soc) AS battery_soc_avg,
           MAX(battery_unit1_battery_temperature) AS battery_temp_max
-        FROM sun2000_monitoring
+        FROM {influxdb_handler.config.influxdb_table}
         WHERE time >= TIMESTAMP '{rollout_filter_start_utc.isoformat()}'
           AND time <  TIMESTAMP '{rollout_filter_end_utc.isoformat()}'
         """
@@ -213,6 +225,46 @@ def daily_rollup_battery(influxdb_handler: InfluxDBHandler, rollout_day:date) ->
     write_rollup_state(influxdb_handler=influxdb_handler, day_local=rollout_day, rollup_type="battery")
     return True
 
+class ShutdownRequest:
+    """Set by SIGTERM/SIGINT. A plain flag, as signal handlers must not take locks."""
+    def __init__(self) -> None:
+        self.requested = False
+
+    def on_signal(self, signum, frame) -> None:
+        self.requested = True
+
+def run_rollups(influxdb_handler:InfluxDBHandler, influxdb_worker:SinkWorker, rollup_map:dict) -> bool:
+    """
+    Roll up every complete day not rolled up yet. Rollups read the telemetry back from InfluxDB,
+    so nothing is rolled up while the InfluxDB sink still has a backlog; returns False then, and
+    the poll loop retries on its next cycle rather than waiting for the sink. Days with telemetry
+    that failed to write or was dropped are skipped and get no rollup state, rather than being
+    rolled up from incomplete data.
+    """
+    if not influxdb_worker.drained():
+        logger.info('InfluxDB sink has not written its backlog yet; postponing rollups to the next cycle')
+        return False
+
+    for rollup_type, rollup_function in rollup_map.items():
+        last_rollup_utc = get_last_rollup_time_utc(handler=influxdb_handler, rollup_type=rollup_type)
+        last_rollup_day_local = last_rollup_utc_to_local(last_rollup_utc=last_rollup_utc)
+        latest_complete_day = get_latest_complete_day()
+        days_to_rollup = get_days_to_rollup(last_rollup_day_local=last_rollup_day_local, latest_complete_day=latest_complete_day)
+
+        for rollup_day in days_to_rollup:
+            day_start_utc = datetime.combine(rollup_day, datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
+            day_end_utc = datetime.combine(rollup_day + timedelta(days=1), datetime.min.time(), tzinfo=LOCAL_TZ).astimezone(UTC)
+            lost = influxdb_worker.lost_between(start=day_start_utc, end=day_end_utc)
+            if lost:
+                logger.error(f'{lost} telemetry cycles of {rollup_day} failed to write or were dropped; skipping {rollup_type} rollup for that day')
+                continue
+            try:
+                logger.info(f'Processing rollup {rollup_type} for day: {rollup_day}')
+                rollup_function(influxdb_handler=influxdb_handler, rollout_day=rollup_day)
+            except Exception as e:
+                logger.error(f'Daily {rollup_type} rollup failed for day {rollup_day}: {e}')
+    return True
+
 def main():
     config = get_config()
     sun2000_client = Sun2000(config=config)
@@ -226,31 +278,55 @@ def main():
     logger.info(f'Sun2000 ping server: {sun2000_client.ping()}')
     logger.info(f'Polling every {config.polling_interval_seconds} seconds')
 
-    while True:
-        try:
-            points = [
-                Point(influxdb_handler.config.influxdb_dbname).tag("source", register_data.source).field(attribute, register_data.value) for attribute, register_data in sun2000_client.poll_all().items()
-            ]
-            influxdb_handler.client.write(points, )
-        except (ModbusIOException, Sun2000NotConnectedError) as e:
-            logger.error(e)
-
-        now_local = datetime.now(LOCAL_TZ)
-        if (now_local.hour == ROLLOUT_HOUR_LOCAL and now_local.minute == ROLLOUT_MINUTE_LOCAL) or ROLLOUT_FORCE:
-            for rollup_type, rollup_function in rollup_map.items():
-                last_rollup_utc = get_last_rollup_time_utc(handler=influxdb_handler, rollup_type=rollup_type)
-                last_rollup_day_local = last_rollup_utc_to_local(last_rollup_utc=last_rollup_utc)
-                latest_complete_day = get_latest_complete_day()
-                days_to_rollup = get_days_to_rollup(last_rollup_day_local=last_rollup_day_local, latest_complete_day=latest_complete_day)
-
-                for rollup_day in days_to_rollup:
-                    try:
-                        logger.info(f'Processing rollup {rollup_type} for day: {rollup_day}')
-                        rollup_function(influxdb_handler=influxdb_handler, rollout_day=rollup_day)
-                    except Exception as e:
-                        logger.error(f'Daily {rollup_type} rollup failed for day {rollup_day}: {e}')
-
-        time.sleep(config.polling_interval_seconds)
+    sink_pipeline = build_pipeline(config=config, influxdb_handler=influxdb_handler)
+    burst_capture = BurstCapture(config=config)
+    diagnostics = Diagnostics(output_dir=config.diagnostics_dir, profile_cycles=config.profile_cycles)
+    signal.signal(signal.SIGUSR1, burst_capture.on_signal)
+    signal.signal(signal.SIGUSR2, diagnostics.on_signal)
+    shutdown = ShutdownRequest()
+    signal.signal(signal.SIGTERM, shutdown.on_signal)
+    signal.signal(signal.SIGINT, shutdown.on_signal)
+    if config.control_port:
+        snapshot_sink = SnapshotSink()
+        sink_pipeline.add(snapshot_sink, queue_size=1)
+        control_server = ControlServer(host=config.control_host, port=config.control_port)
+        control_server.add_route('/burst', burst_capture.handle_request)
+        control_server.add_route('/snapshot', snapshot_sink.snapshot, method='GET')
+        control_server.add_route('/sinks', sink_pipeline.stats, method='GET')
+        control_server.add_route('/profile', diagnostics.handle_profile)
+        control_server.add_route('/tracemalloc/snapshot', diagnostics.handle_snapshot)
+        control_server.add_route('/tracemalloc/stop', diagnostics.handle_stop_tracing)
+        control_server.start()
+    sink_pipeline.start()
+    influxdb_worker = sink_pipeline.worker(InfluxDBSink.name)
+    # rollups run on the first cycle past the rollout time, as no poll is guaranteed to land in that exact minute
+    now_local = CLOCK.now(LOCAL_TZ)
+    rollup_checked_day = now_local.date() if rollout_time_reached(now_local) else now_local.date() - timedelta(days=1)
+
+    try:
+        while not shutdown.requested:
+            diagnostics.on_cycle()
+            # before this cycle's telemetry is queued, so a sink that keeps up is found drained
+            now_local = CLOCK.now(LOCAL_TZ)
+            if (now_local.date() != rollup_checked_day and rollout_time_reached(now_local)) or ROLLOUT_FORCE:
+                if run_rollups(influxdb_handler=influxdb_handler, influxdb_worker=influxdb_worker, rollup_map=rollup_map):
+                    rollup_checked_day = now_local.date()
+
+            if burst_capture.pending():
+                burst_capture.run(sun2000_client=sun2000_client, influxdb_handler=influxdb_handler, stop=lambda: shutdown.requested)
+
+            try:
+                polled = sun2000_client.poll_all()
+                sink_pipeline.publish(Cycle(time=CLOCK.now(UTC), polled=polled))
+                burst_capture.check_thresholds(polled)
+            except (ModbusIOException, Sun2000NotConnectedError) as e:
+                logger.error(e)
+
+            # returns early when a burst capture or shutdown is requested
+            CLOCK.wait(lambda: burst_capture.pending() or shutdown.requested, timeout=config.polling_interval_seconds)
+    finally:
+        logger.info('Stopping sinks')
+        sink_pipeline.stop()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,74 @@
+import argparse
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+import pyarrow as pa
+
+from config import get_config
+from influxdb import InfluxDBHandler
+from schema import TABLE_SCHEMA, coerce, to_points
+from sun2000 import RegisterData
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+UTC = timezone.utc
+
+
+def migrate_day(influxdb_handler:InfluxDBHandler, legacy_table:str, day:date) -> int:
+    """
+    Copy one UTC day of legacy telemetry into the typed table, merging the sparse
+    single-field rows into one dense row per source and timestamp.
+    """
+    start_utc = datetime.combine(day, datetime.min.time(), tzinfo=UTC)
+    end_utc = start_utc + timedelta(days=1)
+    query = f"""
+    SELECT *
+    FROM {legacy_table}
+    WHERE time >= TIMESTAMP '{start_utc.isoformat()}'
+      AND time <  TIMESTAMP '{end_utc.isoformat()}'
+    """
+    table = influxdb_handler.client.query(query)
+    if table.num_rows == 0:
+        return 0
+
+    # nanosecond timestamps don't convert to datetime without pandas; keep them as integers
+    table = table.set_column(table.column_names.index('time'), 'time', table.column('time').cast(pa.int64()))
+    rows: Dict[Tuple[int, str], Dict[str, RegisterData]] = {}
+    for row in table.to_pylist():
+        polled = rows.setdefault((row['time'], row['source']), {})
+        for name, value in row.items():
+            if name in TABLE_SCHEMA and value is not None:
+                polled[name] = RegisterData(row['source'], coerce(name, value))
+
+    points = []
+    for (t, _), polled in rows.items():
+        points.extend(to_points(table=influxdb_handler.config.influxdb_table, polled=polled, time=t))
+    influxdb_handler.client.write(points)
+    return len(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy telemetry written by older monitor versions into the typed telemetry table.')
+    # older versions wrote telemetry to a table named after the database (INFLUXDB_DBNAME)
+    parser.add_argument('--from-table', help='legacy table to read (default INFLUXDB_DBNAME)')
+    parser.add_argument('--start', type=date.fromisoformat, required=True, help='first UTC day to migrate, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, default=datetime.now(UTC).date(), help='last UTC day to migrate, YYYY-MM-DD (default today)')
+    args = parser.parse_args()
+
+    config = get_config()
+    if args.from_table is None:
+        args.from_table = config.influxdb_dbname
+    influxdb_handler = InfluxDBHandler(config=config)
+    logger.info(f'Migrating {args.from_table} -> {config.influxdb_table} from {args.start} to {args.end}')
+
+    day = args.start
+    while day <= args.end:
+        written = migrate_day(influxdb_handler=influxdb_handler, legacy_table=args.from_table, day=day)
+        logger.info(f'{day}: {written} rows written')
+        day += timedelta(days=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+import logging
+import struct
+from enum import Enum
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from sun2000_modbus import registers
+from sun2000_modbus.datatypes import DataType
+
+logger = logging.getLogger(__name__)
+
+Value = Union[str, int, float, None]
+
+# Modbus caps a single holding register read at 125 words; the inverter's WiFi
+# dongle is happier with smaller frames, so blocks are kept well below that.
+MAX_BLOCK_WORDS = 64
+# Unused registers between two polled ones are read and discarded as long as
+# the gap is small and every register in it is documented (see KNOWN_ADDRESSES);
+# otherwise a new block starts.
+MAX_GAP_WORDS = 16
+
+STRUCT_CODES = {
+    DataType.UINT16_BE: 'H',
+    DataType.INT16_BE: 'h',
+    DataType.UINT32_BE: 'I',
+    DataType.INT32_BE: 'i',
+    DataType.BITFIELD16: 'H',
+    DataType.BITFIELD32: 'I',
+}
+
+
+class ColumnType(Enum):
+    INTEGER = 'integer'
+    FLOAT = 'float'
+    STRING = 'string'
+
+
+class RegisterDescriptor(NamedTuple):
+    name: str
+    source: str
+    address: int
+    length: int
+    data_type: DataType
+    gain: Optional[float]
+    column_type: ColumnType
+    post: Optional[Callable[[Value], Value]] = None
+
+    @classmethod
+    def from_register(cls, name:str, source:str, register, post:Optional[Callable[[Value], Value]]=None) -> 'RegisterDescriptor':
+        spec = register.value
+        if spec.data_type == DataType.STRING:
+            column_type = ColumnType.STRING
+        elif spec.gain is None or spec.gain == 1:
+            # enums, bitfields and whole-unit measurements (W, Wh, var)
+            column_type = ColumnType.INTEGER
+        else:
+            column_type = ColumnType.FLOAT
+        return cls(name, source, spec.address, spec.quantity, spec.data_type, spec.gain, column_type, post)
+
+    @property
+    def struct_code(self) -> str:
+        if self.data_type == DataType.STRING:
+            return f'{self.length * 2}s'
+        return STRUCT_CODES[self.data_type]
+
+    def convert(self, raw:Union[bytes, int]) -> Value:
+        """
+        Turn a raw struct value into a value of the register's column type,
+        then apply the post-processing hook, if any.
+        """
+        if self.column_type == ColumnType.STRING:
+            value = raw.decode('utf-8', 'replace').strip('\0')
+        elif self.column_type == ColumnType.INTEGER:
+            value = raw
+        else:
+            value = raw / self.gain
+        if self.post is not None:
+            value = self.post(value)
+        return value
+
+
+class RegisterBlock(NamedTuple):
+    start: int
+    quantity: int
+    descriptors: Tuple[RegisterDescriptor, ...]
+    layout: struct.Struct
+
+    def decode(self, raw:bytes) -> Dict[str, Value]:
+        return {
+            descriptor.name: descriptor.convert(raw_value)
+            for descriptor, raw_value in zip(self.descriptors, self.layout.unpack(raw))
+        }
+
+
+INVERTER = registers.InverterEquipmentRegister
+BATTERY = registers.BatteryEquipmentRegister
+METER = registers.MeterEquipmentRegister
+
+# Addresses documented in the register tables. Reading an undocumented address makes the
+# inverter answer the whole request with an exception, so gaps are only read through when
+# every address in them is listed here.
+KNOWN_ADDRESSES = frozenset(
+    address
+    for register_table in (INVERTER, BATTERY, METER)
+    for register in register_table
+    for address in range(register.value.address, register.value.address + register.value.quantity)
+)
+
+
+def plan_blocks(descriptors:List[RegisterDescriptor], max_block_words:int=MAX_BLOCK_WORDS, max_gap_words:int=MAX_GAP_WORDS) -> List[RegisterBlock]:
+    """
+    Group descriptors into contiguous register blocks, each read with a single Modbus request
+    and decoded with a single precompiled struct layout. Blocks never span two sources, so a
+    missing battery or meter only fails its own blocks.
+    """
+    blocks = []
+    group: List[RegisterDescriptor] = []
+
+    def close_group():
+        start = group[0].address
+        end = max(d.address + d.length for d in group)
+        fmt = '>'
+        cursor = start
+        for d in group:
+            if d.address > cursor:
+                fmt += f'{(d.address - cursor) * 2}x'
+            fmt += d.struct_code
+            cursor = d.address + d.length
+        if end > cursor:
+            fmt += f'{(end - cursor) * 2}x'
+        blocks.append(RegisterBlock(start, end - start, tuple(group), struct.Struct(fmt)))
+
+    for descriptor in sorted(descriptors, key=lambda d: d.address):
+        if group:
+            group_end = max(d.address + d.length for d in group)
+            gap = descriptor.address - group_end
+            if gap < 0 or gap > max_gap_words or descriptor.address + descriptor.length - group[0].address > max_block_words \
+                    or descriptor.source != group[0].source \
+                    or not KNOWN_ADDRESSES.issuperset(range(group_end, descriptor.address)):
+                close_group()
+                group = []
+        group.append(descriptor)
+    if group:
+        close_group()
+    return blocks
+
+
+def decode_state1(state1_int:int) -> int:
+    if state1_int & (1 << 6):
+        return 6  # Fault
+    if state1_int & (1 << 8):
+        return 8  # Shutdown
+    if state1_int & (1 << 3) or state1_int & (1 << 4):
+        return 4  # Derating
+    if state1_int & (1 << 1):
+        return 2  # Grid connected
+    if state1_int & (1 << 0):
+        return 1  # Standby
+    return 0  # Unknown
+
+
+def check_battery_temperature(value:float) -> Union[float, None]:
+    if int(value) > 100:
+        logger.warning(f'Battery unit 1 temperature reading seems invalid: {value}')
+        return None
+    return value
+
+
+
+REGISTER_MAP: Dict[str, RegisterDescriptor] = {d.name: d for d in [
+    RegisterDescriptor.from_register('model', 'inverter', INVERTER.Model),
+    RegisterDescriptor.from_register('sn', 'inverter', INVERTER.SN),
+    RegisterDescriptor.from_register('pn', 'inverter', INVERTER.PN),
+    RegisterDescriptor.from_register('firmware_version', 'inverter', INVERTER.FirmwareVersion),
+    RegisterDescriptor.from_register('software_version', 'inverter', INVERTER.SoftwareVersion),
+    RegisterDescriptor.from_register('protocol_version', 'inverter', INVERTER.ProtocolVersion),
+    RegisterDescriptor.from_register('model_id', 'inverter', INVERTER.ModelID),
+    RegisterDescriptor.from_register('rated_power', 'inverter', INVERTER.RatedPower),  # W
+    RegisterDescriptor.from_register('maximum_active_power', 'inverter', INVERTER.MaximumActivePower),  # W
+    RegisterDescriptor.from_register('maximum_apparent_power', 'inverter', INVERTER.MaximumApparentPower),  # kVA
+    RegisterDescriptor.from_register('state1', 'inverter', INVERTER.State1, post=decode_state1),
+    RegisterDescriptor.from_register('state2', 'inverter', INVERTER.State2),
+    RegisterDescriptor.from_register('state3', 'inverter', INVERTER.State3),
+    RegisterDescriptor.from_register('peak_active_power_of_current_day', 'inverter', INVERTER.PeakActivePowerOfCurrentDay),  # W
+    RegisterDescriptor.from_register('active_power', 'inverter', INVERTER.ActivePower),  # W
+    RegisterDescriptor.from_register('input_power', 'inverter', INVERTER.InputPower),  # W
+    RegisterDescriptor.from_register('reactive_power', 'inverter', INVERTER.ReactivePower),  # kvar
+    RegisterDescriptor.from_register('power_factor', 'inverter', INVERTER.PowerFactor),
+    RegisterDescriptor.from_register('grid_frequency', 'inverter', INVERTER.GridFrequency),  # Hz
+    RegisterDescriptor.from_register('efficiency', 'inverter', INVERTER.Efficiency),  # %
+    RegisterDescriptor.from_register('internal_temperature', 'inverter', INVERTER.InternalTemperature),  # C
+    RegisterDescriptor.from_register('device_status', 'inverter', INVERTER.DeviceStatus),
+    RegisterDescriptor.from_register('accumulated_energy_yield', 'inverter', INVERTER.AccumulatedEnergyYield),  # kWh
+    RegisterDescriptor.from_register('daily_energy_yield', 'inverter', INVERTER.DailyEnergyYield),  # kWh
+    RegisterDescriptor.from_register('battery_running_status', 'battery', BATTERY.RunningStatus),
+    RegisterDescriptor.from_register('battery_working_mode_settings', 'battery', BATTERY.WorkingModeSettings),
+    RegisterDescriptor.from_register('battery_charge_discharge_power', 'battery', BATTERY.ChargeDischargePower),  # W
+    RegisterDescriptor.from_register('battery_rated_capacity', 'battery', BATTERY.RatedCapacity),  # Wh
+    RegisterDescriptor.from_register('battery_soc', 'battery', BATTERY.SOC),  # %
+    RegisterDescriptor.from_register('battery_backup_power_soc', 'battery', BATTERY.BackupPowerSOC),  # %
+    RegisterDescriptor.from_register('battery_unit1_battery_temperature', 'battery', BATTERY.Unit1BatteryTemperature, post=check_battery_temperature),  # C
+    RegisterDescriptor.from_register('battery_total_charge', 'battery', BATTERY.TotalCharge),  # kWh
+    RegisterDescriptor.from_register('battery_total_discharge', 'battery', BATTERY.TotalDischarge),  # kWh
+    RegisterDescriptor.from_register('battery_current_day_charge_capacity', 'battery', BATTERY.CurrentDayChargeCapacity),  # kWh
+    RegisterDescriptor.from_register('battery_current_day_discharge_capacity', 'battery', BATTERY.CurrentDayDischargeCapacity),  # kWh
+    # 0: offline, 1: normal
+    RegisterDescriptor.from_register('meter_status', 'meter', METER.MeterStatus),
+    RegisterDescriptor.from_register('meter_a_phase_voltage', 'meter', METER.APhaseVoltage),  # V
+    RegisterDescriptor.from_register('meter_b_phase_voltage', 'meter', METER.BPhaseVoltage),  # V
+    RegisterDescriptor.from_register('meter_c_phase_voltage', 'meter', METER.CPhaseVoltage),  # V
+    RegisterDescriptor.from_register('meter_a_phase_current', 'meter', METER.APhaseCurrent),  # A
+    RegisterDescriptor.from_register('meter_b_phase_current', 'meter', METER.BPhaseCurrent),  # A
+    RegisterDescriptor.from_register('meter_c_phase_current', 'meter', METER.CPhaseCurrent),  # A
+    # W; >0: feed-in to the power grid, <0: supply from the power grid
+    RegisterDescriptor.from_register('meter_active_power', 'meter', METER.ActivePower),
+    RegisterDescriptor.from_register('meter_reactive_power', 'meter', METER.ReactivePower),  # var
+    RegisterDescriptor.from_register('meter_power_factor', 'meter', METER.PowerFactor),
+    RegisterDescriptor.from_register('meter_grid_frequency', 'meter', METER.GridFrequency),  # Hz
+    # kWh; electricity fed by the inverter to the power grid
+    RegisterDescriptor.from_register('meter_positive_active_electricity', 'meter', METER.PositiveActiveElectricity),
+    # kWh; power supplied to a distributed system from the power grid
+    RegisterDescriptor.from_register('meter_reverse_active_power', 'meter', METER.ReverseActivePower),
+    # 0: single phase, 1: three phase
+    RegisterDescriptor.from_register('meter_meter_type', 'meter', METER.MeterType),
+    # W; >0: feed-in to the power grid, <0: supply from the power grid
+    RegisterDescriptor.from_register('meter_a_phase_active_power', 'meter', METER.APhaseActivePower),
+    RegisterDescriptor.from_register('meter_b_phase_active_power', 'meter', METER.BPhaseActivePower),
+    RegisterDescriptor.from_register('meter_c_phase_active_power', 'meter', METER.CPhaseActivePower),
+]}
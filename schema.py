@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Dict, List, Mapping, Union
+
+from influxdb_client_3 import Point
+from sun2000_modbus.datatypes import DataType
+
+from register_map import REGISTER_MAP, ColumnType, Value
+from sun2000 import RegisterData
+
+# Fixed column type of every telemetry field; the table holds one row per source and poll cycle.
+TABLE_SCHEMA: Dict[str, ColumnType] = {name: descriptor.column_type for name, descriptor in REGISTER_MAP.items()}
+
+def coerce(name:str, value:Value) -> Value:
+    """
+    Cast a value written by an older monitor version to the field's column type.
+    """
+    if value is None:
+        return None
+    column_type = TABLE_SCHEMA[name]
+    if column_type == ColumnType.STRING:
+        return str(value)
+    if column_type == ColumnType.FLOAT:
+        return float(value)
+    if isinstance(value, str):
+        descriptor = REGISTER_MAP[name]
+        # bitfields used to be stored as '0101...' strings, decoded states as '6', '8', ...
+        if descriptor.data_type in (DataType.BITFIELD16, DataType.BITFIELD32) and descriptor.post is None:
+            return int(value, 2)
+        return int(value)
+    return int(round(value))
+
+
+def to_points(table:str, polled:Mapping[str, RegisterData], time:Union[datetime, int, str]) -> List[Point]:
+    """
+    Build one dense point per source, all sharing the cycle timestamp.
+    """
+    points: Dict[str, Point] = {}
+    for name, register_data in polled.items():
+        if register_data.value is None:
+            continue
+        if register_data.source not in points:
+            points[register_data.source] = Point(table).tag('source', register_data.source).time(time)
+        points[register_data.source].field(name, register_data.value)
+    return list(points.values())
@@ -0,0 +1,270 @@
+import json
+import logging
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from config import MonitorConfig
+from influxdb import InfluxDBHandler
+from schema import to_points
+from sun2000 import RegisterData
+
+logger = logging.getLogger(__name__)
+
+# How long a BLOCK sink may hold up the poll loop before the cycle is dropped for it.
+BLOCK_TIMEOUT_SECONDS = 1.0
+# How long failed and dropped cycles are remembered, so rollups catching up after a while can tell a day is incomplete.
+LOST_HISTORY = timedelta(days=7)
+
+
+class Cycle(NamedTuple):
+    """One acquisition, shared read-only by all sinks."""
+    time: datetime
+    polled: Dict[str, RegisterData]
+
+
+class DropPolicy(Enum):
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    BLOCK = 'block'
+
+
+class Sink(ABC):
+    name = 'sink'
+
+    @abstractmethod
+    def write(self, cycle:Cycle)->None:
+        ...
+
+    def close(self)->None:
+        pass
+
+
+class InfluxDBSink(Sink):
+    name = 'influxdb'
+
+    def __init__(self, influxdb_handler:InfluxDBHandler)->None:
+        self.influxdb_handler = influxdb_handler
+
+    def write(self, cycle:Cycle)->None:
+        points = to_points(table=self.influxdb_handler.config.influxdb_table, polled=cycle.polled, time=cycle.time)
+        self.influxdb_handler.client.write(points)
+
+
+def by_source(cycle:Cycle)->Dict[str, Dict[str, Union[str, int, float]]]:
+    sources: Dict[str, Dict[str, Union[str, int, float]]] = {}
+    for name, register_data in cycle.polled.items():
+        if register_data.value is not None:
+            sources.setdefault(register_data.source, {})[name] = register_data.value
+    return sources
+
+
+class FileSink(Sink):
+    """Appends one JSON line per cycle."""
+    name = 'file'
+
+    def __init__(self, path:str)->None:
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, cycle:Cycle)->None:
+        self.file.write(json.dumps({'time': cycle.time.isoformat(), **by_source(cycle)}) + '\n')
+        self.file.flush()
+
+    def close(self)->None:
+        self.file.close()
+
+
+class MqttSink(Sink):
+    """Publishes one JSON message per source to `<topic>/<source>`, eg. sun2000/meter."""
+    name = 'mqtt'
+
+    def __init__(self, host:str, port:int, topic:str)->None:
+        # only needed when MQTT publishing is enabled
+        import paho.mqtt.client as mqtt
+
+        self.topic = topic
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id='sun2000_monitor')
+        self.client.connect_async(host, port)
+        self.client.loop_start()
+
+    def write(self, cycle:Cycle)->None:
+        if not self.client.is_connected():
+            raise ConnectionError('MQTT broker not connected')
+        for source, fields in by_source(cycle).items():
+            self.client.publish(f'{self.topic}/{source}', json.dumps({'time': cycle.time.isoformat(), **fields}))
+
+    def close(self)->None:
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class SnapshotSink(Sink):
+    """Keeps the latest cycle for the control endpoint's GET /snapshot."""
+    name = 'snapshot'
+
+    def __init__(self)->None:
+        self.latest: Union[Cycle, None] = None
+
+    def write(self, cycle:Cycle)->None:
+        self.latest = cycle
+
+    def snapshot(self, params:Dict[str, str])->dict:
+        if self.latest is None:
+            return {}
+        return {'time': self.latest.time.isoformat(), **by_source(self.latest)}
+
+
+class SinkWorker:
+    """
+    Feeds one sink from its own bounded queue on its own thread, so a slow or failing
+    sink never delays polling or the other sinks.
+    """
+    def __init__(self, sink:Sink, queue_size:int, policy:DropPolicy)->None:
+        self.sink = sink
+        self.policy = policy
+        # cycles are queued with their monotonic enqueue time, for the latency metrics
+        self.queue: 'queue.Queue[Union[Tuple[Cycle, float], None]]' = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name=f'sink-{sink.name}', daemon=True)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        # cycles that failed to write or were dropped, counted per minute of their poll time
+        self.lost_minutes: Counter = Counter()
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+
+    def submit(self, cycle:Cycle)->None:
+        item = (cycle, time.monotonic())
+        try:
+            if self.policy == DropPolicy.BLOCK:
+                self.queue.put(item, timeout=BLOCK_TIMEOUT_SECONDS)
+            else:
+                self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        dropped_cycle = cycle
+        if self.policy == DropPolicy.DROP_OLDEST:
+            try:
+                oldest = self.queue.get_nowait()
+                self.queue.task_done()
+                self.queue.put_nowait(item)
+                if oldest is not None:
+                    dropped_cycle = oldest[0]
+            except (queue.Empty, queue.Full):
+                pass
+        self.record_drop(dropped_cycle)
+
+    def record_drop(self, cycle:Cycle)->None:
+        with self.lock:
+            self.dropped += 1
+            dropped = self.dropped
+            self.record_lost(cycle)
+        if dropped == 1 or dropped % 100 == 0:
+            logger.warning(f'Sink {self.sink.name} is falling behind: {dropped} cycles dropped so far')
+
+    def record_lost(self, cycle:Cycle)->None:
+        # called with self.lock held
+        minute = cycle.time.replace(second=0, microsecond=0)
+        if minute not in self.lost_minutes:
+            cutoff = minute - LOST_HISTORY
+            for old in [m for m in self.lost_minutes if m < cutoff]:
+                del self.lost_minutes[old]
+        self.lost_minutes[minute] += 1
+
+    def run(self)->None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            cycle, enqueued = item
+            try:
+                self.sink.write(cycle)
+            except Exception as e:
+                with self.lock:
+                    self.failed += 1
+                    self.record_lost(cycle)
+                logger.error(f'Sink {self.sink.name} failed to write cycle {cycle.time.isoformat()}: {e}')
+                continue
+            finally:
+                self.queue.task_done()
+            latency = time.monotonic() - enqueued
+            with self.lock:
+                self.written += 1
+                self.latency_last = latency
+                self.latency_max = max(self.latency_max, latency)
+                self.latency_total += latency
+        self.sink.close()
+
+    def drained(self)->bool:
+        """True once every queued cycle has been written or has failed. Never blocks."""
+        with self.queue.mutex:
+            return self.queue.unfinished_tasks == 0
+
+    def lost_between(self, start:datetime, end:datetime)->int:
+        """Cycles polled in [start, end) that failed to write or were dropped; start and end on whole minutes."""
+        with self.lock:
+            return sum(count for minute, count in self.lost_minutes.items() if start <= minute < end)
+
+    def stats(self)->dict:
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'latency_last_seconds': round(self.latency_last, 3),
+                'latency_avg_seconds': round(self.latency_total / self.written, 3) if self.written else None,
+                'latency_max_seconds': round(self.latency_max, 3),
+            }
+
+
+class SinkPipeline:
+    """Fans every acquisition out to all registered sinks."""
+    def __init__(self)->None:
+        self.workers: List[SinkWorker] = []
+
+    def add(self, sink:Sink, queue_size:int, policy:DropPolicy=DropPolicy.DROP_OLDEST)->None:
+        self.workers.append(SinkWorker(sink=sink, queue_size=queue_size, policy=policy))
+
+    def worker(self, name:str)->SinkWorker:
+        return next(worker for worker in self.workers if worker.sink.name == name)
+
+    def start(self)->None:
+        for worker in self.workers:
+            worker.thread.start()
+        logger.info(f'Sinks: {", ".join(f"{w.sink.name} ({w.policy.value}, queue {w.queue.maxsize})" for w in self.workers)}')
+
+    def publish(self, cycle:Cycle)->None:
+        for worker in self.workers:
+            worker.submit(cycle)
+
+    def stop(self, timeout:float=5.0)->None:
+        for worker in self.workers:
+            try:
+                worker.queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning(f'Sink {worker.sink.name} did not drain in time, {worker.queue.qsize()} cycles lost')
+        for worker in self.workers:
+            worker.thread.join(timeout=timeout)
+
+    def stats(self, params:Union[Dict[str, str], None]=None)->dict:
+        return {worker.sink.name: worker.stats() for worker in self.workers}
+
+
+def build_pipeline(config:MonitorConfig, influxdb_handler:InfluxDBHandler)->SinkPipeline:
+    pipeline = SinkPipeline()
+    pipeline.add(InfluxDBSink(influxdb_handler=influxdb_handler), queue_size=config.sink_queue_size, policy=DropPolicy(config.sink_policy_influxdb))
+    if config.mqtt_host:
+        pipeline.add(MqttSink(host=config.mqtt_host, port=config.mqtt_port, topic=config.mqtt_topic), queue_size=config.sink_queue_size, policy=DropPolicy(config.sink_policy_mqtt))
+    if config.file_sink_path:
+        pipeline.add(FileSink(path=config.file_sink_path), queue_size=config.sink_queue_size, policy=DropPolicy(config.sink_policy_file))
+    return pipeline
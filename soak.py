@@ -0,0 +1,715 @@
+"""
+Accelerated-clock end-to-end soak test.
+
+Runs main() against a simulated inverter (a local Modbus TCP server) and a stand-in
+InfluxDB 3 (line protocol over HTTP, SQL over Flight, executed by DataFusion) with a
+simulated clock: waits between poll cycles take no real time, so weeks of polling,
+midnight rollups and DST transitions in LOCAL_TZ run in minutes.
+
+At the end it checks every expected daily rollup row against the raw telemetry, the
+poll-loop jitter around the midnight rollup window and the RSS growth of the monitor,
+and exits non-zero if any check fails.
+
+    pip install -r requirements-soak.txt
+    python soak.py --start 2026-03-23 --days 14
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+import urllib.request
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow as pa
+import pyarrow.flight as flight
+from influxdb_client_3 import InfluxDB3ClientQueryError
+
+from clock import Clock
+from diagnostics import rss_kib
+from register_map import REGISTER_MAP, ColumnType
+from sinks import InfluxDBSink
+
+logger = logging.getLogger('soak')
+
+UTC = timezone.utc
+SOAK_DBNAME = 'sun2000_monitoring'
+PRECISION_SCALE = {'ns': 1, 'us': 1_000, 'ms': 1_000_000, 's': 1_000_000_000}
+ROLLUP_TYPES = ['energy_breakdown', 'battery']
+# poll cycles starting in this local time window count as the midnight rollup window
+MIDNIGHT_WINDOW = (dt_time(23, 55), dt_time(0, 10))
+
+
+# --- stand-in InfluxDB 3 ---------------------------------------------------------------------
+
+class LineProtocolError(ValueError):
+    pass
+
+
+def split_unescaped(text:str, separator:str) -> List[str]:
+    parts, current, i = [], '', 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            current += text[i + 1]
+            i += 2
+            continue
+        if c == separator:
+            parts.append(current)
+            current = ''
+        else:
+            current += c
+        i += 1
+    parts.append(current)
+    return parts
+
+
+def parse_field_value(raw:str) -> Union[str, int, float, bool]:
+    if raw.endswith('i') or raw.endswith('u'):
+        return int(raw[:-1])
+    if raw in ('t', 'T', 'true', 'True', 'TRUE'):
+        return True
+    if raw in ('f', 'F', 'false', 'False', 'FALSE'):
+        return False
+    return float(raw)
+
+
+def parse_line(line:str, precision:str) -> Tuple[str, Tuple[Tuple[str, str], ...], Dict[str, Union[str, int, float, bool]], Union[int, None]]:
+    """Parse one line of line protocol into (measurement, tags, fields, time in ns)."""
+    i, n = 0, len(line)
+    while i < n and not (line[i] == ' ' and (i == 0 or line[i - 1] != '\\')):
+        i += 1
+    key = split_unescaped(line[:i], ',')
+    measurement, tags = key[0], []
+    for tag in key[1:]:
+        k, _, v = tag.partition('=')
+        tags.append((k, v))
+
+    fields = {}
+    i += 1
+    while i < n:
+        j = i
+        while j < n and line[j] != '=':
+            j += 2 if line[j] == '\\' else 1
+        name = line[i:j].replace('\\', '')
+        j += 1
+        if j < n and line[j] == '"':
+            value, j = '', j + 1
+            while j < n and line[j] != '"':
+                if line[j] == '\\' and j + 1 < n:
+                    j += 1
+                value += line[j]
+                j += 1
+            fields[name] = value
+            j += 1
+        else:
+            k = j
+            while k < n and line[k] not in ', ':
+                k += 1
+            fields[name] = parse_field_value(line[j:k])
+            j = k
+        if j >= n or line[j] == ' ':
+            i = j
+            break
+        i = j + 1
+    if not fields:
+        raise LineProtocolError(f'no fields in line: {line}')
+    timestamp = line[i:].strip()
+    t = int(timestamp) * PRECISION_SCALE[precision] if timestamp else None
+    return measurement, tuple(sorted(tags)), fields, t
+
+
+ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+
+
+class Table:
+    """Rows keyed by series and time; writes to an existing key merge fields, as in InfluxDB."""
+    def __init__(self) -> None:
+        self.rows: Dict[Tuple[int, Tuple[Tuple[str, str], ...]], Dict[str, Union[str, int, float, bool]]] = {}
+        self.tag_names: set = set()
+        self.field_types: Dict[str, type] = {}
+        # appending rows keeps the cached Arrow table; new columns or merged rows rebuild it
+        self.cached: Union[pa.Table, None] = None
+        self.appended: List[Tuple[int, Tuple[Tuple[str, str], ...]]] = []
+
+    def check_types(self, fields:Dict[str, Union[str, int, float, bool]]) -> None:
+        for name, value in fields.items():
+            expected = self.field_types.get(name)
+            if expected is not None and expected is not type(value):
+                raise LineProtocolError(f"invalid column type for column '{name}', expected {expected.__name__}, got {type(value).__name__}")
+
+    def write(self, tags, fields, t:int) -> None:
+        key = (t, tags)
+        if key in self.rows or any(name not in self.field_types for name in fields) or any(k not in self.tag_names for k, _ in tags):
+            self.cached = None
+            self.appended = []
+        else:
+            self.appended.append(key)
+        for name, value in fields.items():
+            self.field_types.setdefault(name, type(value))
+        self.tag_names.update(k for k, _ in tags)
+        self.rows.setdefault(key, {}).update(fields)
+
+    def build(self, keys) -> pa.Table:
+        columns = {'time': pa.array([t for t, _ in keys], pa.timestamp('ns'))}
+        for tag in sorted(self.tag_names):
+            columns[tag] = pa.array([dict(tags).get(tag) for _, tags in keys], pa.string())
+        for name, field_type in sorted(self.field_types.items()):
+            columns[name] = pa.array([self.rows[key].get(name) for key in keys], ARROW_TYPES[field_type])
+        return pa.table(columns)
+
+    def to_arrow(self) -> pa.Table:
+        if self.cached is None:
+            self.cached = self.build(list(self.rows))
+        elif self.appended:
+            self.cached = pa.concat_tables([self.cached, self.build(self.appended)]).combine_chunks()
+        self.appended = []
+        return self.cached
+
+
+class FakeInfluxDB:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.tables: Dict[str, Table] = {}
+        self.write_requests: Dict[str, int] = {}
+        self.rejected: List[str] = []
+        # cleared to hold writes, as a slow or briefly unreachable InfluxDB would
+        self.writable = threading.Event()
+        self.writable.set()
+
+    def write(self, body:str, precision:str) -> None:
+        parsed = [parse_line(line, precision) for line in body.splitlines() if line.strip() and not line.startswith('#')]
+        now_ns = time.time_ns()
+        with self.lock:
+            # the whole request is rejected on a type conflict, like InfluxDB 3 does
+            for measurement, tags, fields, t in parsed:
+                if measurement in self.tables:
+                    self.tables[measurement].check_types(fields)
+            for measurement in {p[0] for p in parsed}:
+                self.write_requests[measurement] = self.write_requests.get(measurement, 0) + 1
+            for measurement, tags, fields, t in parsed:
+                self.tables.setdefault(measurement, Table()).write(tags, fields, now_ns if t is None else t)
+
+    def query(self, sql:str) -> pa.Table:
+        import datafusion
+
+        if 'system.databases' in sql:
+            return pa.table({'database_name': [SOAK_DBNAME]})
+        ctx = datafusion.SessionContext()
+        with self.lock:
+            for name in set(re.findall(r'\bFROM\s+"?(\w+)"?', sql, re.IGNORECASE)):
+                if name not in self.tables:
+                    raise flight.FlightServerError(f"Error during planning: table 'public.iox.{name}' not found")
+                ctx.register_record_batches(name, [self.tables[name].to_arrow().to_batches()])
+        try:
+            return ctx.sql(sql).to_arrow_table()
+        except Exception as e:
+            raise flight.FlightServerError(str(e))
+
+
+class FlightService(flight.FlightServerBase):
+    def __init__(self, db:FakeInfluxDB, location:str) -> None:
+        super().__init__(location)
+        self.db = db
+
+    def do_get(self, context, ticket):
+        request = json.loads(ticket.ticket.decode())
+        return flight.RecordBatchStream(self.db.query(request['sql_query']))
+
+
+def serve_fake_influxdb(ports) -> None:
+    """Child process entry point; reports its (http, flight) ports through the pipe."""
+    logging.basicConfig(level=logging.WARNING)
+    db = FakeInfluxDB()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.startswith('/ping'):
+                self.reply(200, {'version': '3.7.0-soak'}, {'X-Influxdb-Version': '3.7.0-soak'})
+            elif self.path.startswith('/_soak/stats'):
+                with db.lock:
+                    self.reply(200, {'write_requests': dict(db.write_requests), 'rejected': list(db.rejected)})
+            else:
+                self.reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            if url.path == '/_soak/stall':
+                if parse_qs(url.query).get('on', ['0'])[0] == '1':
+                    db.writable.clear()
+                else:
+                    db.writable.set()
+                self.reply(204, None)
+                return
+            if url.path not in ('/api/v2/write', '/api/v3/write_lp'):
+                self.reply(404, {'error': 'not found'})
+                return
+            db.writable.wait(timeout=60)
+            precision = parse_qs(url.query).get('precision', ['ns'])[0]
+            try:
+                db.write(body.decode(), precision)
+            except (LineProtocolError, ValueError) as e:
+                with db.lock:
+                    db.rejected.append(str(e))
+                self.reply(400, {'error': str(e)})
+                return
+            self.reply(204, None)
+
+        def reply(self, status:int, body, headers:Union[Dict[str, str], None]=None):
+            payload = json.dumps(body).encode() if body is not None else b''
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    flight_server = FlightService(db, 'grpc+tcp://127.0.0.1:0')
+    ports.send((http_server.server_address[1], flight_server.port))
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    flight_server.serve()
+
+
+# --- simulated clock and inverter -----------------------------------------------------------
+
+class SoakFinished(Exception):
+    pass
+
+
+class SimulatedClock(Clock):
+    """
+    Real time spent working is simulated time as well, so poll-loop jitter stays measurable;
+    waits between cycles advance the clock instantly.
+    """
+    def __init__(self, start:datetime, end:datetime) -> None:
+        self.lock = threading.Lock()
+        self.base = start
+        self.end = end
+        self.real_mark = time.monotonic()
+        self.hooks = []
+
+    def now(self, tz) -> datetime:
+        with self.lock:
+            return (self.base + timedelta(seconds=time.monotonic() - self.real_mark)).astimezone(tz)
+
+    def wait(self, until:Callable[[], bool], timeout:float) -> bool:
+        with self.lock:
+            worked = time.monotonic() - self.real_mark
+        # hooks (letting the sinks drain, sampling RSS) run outside simulated time
+        for hook in self.hooks:
+            hook()
+        with self.lock:
+            woken = until()
+            self.base += timedelta(seconds=worked + (0 if woken else timeout))
+            self.real_mark = time.monotonic()
+            if self.base >= self.end:
+                raise SoakFinished()
+        return woken
+
+    def skip_to(self, t:datetime) -> None:
+        with self.lock:
+            self.base = t
+            self.real_mark = time.monotonic()
+
+
+class SimulatedPlant:
+    """A 5 kW PV array, a 10 kWh battery and a 500 W house load, integrated over simulated time."""
+    PV_PEAK_W = 5000.0
+    LOAD_W = 500.0
+    BATTERY_CAPACITY_WH = 10000.0
+    BATTERY_MAX_W = 2500.0
+    # a long gap between reads (an outage) is integrated in steps, so it still follows the daily curve
+    STEP = timedelta(minutes=5)
+
+    def __init__(self, clock:SimulatedClock, local_tz) -> None:
+        self.clock = clock
+        self.local_tz = local_tz
+        self.last = None
+        self.soc = 50.0
+        self.counters = {name: 0.0 for name in ('pv', 'feed_in', 'from_grid', 'charge', 'discharge', 'pv_day', 'charge_day', 'discharge_day')}
+        self.values: Dict[str, Union[str, int, float]] = {}
+        self.day = None
+
+    def power(self, now:datetime) -> Tuple[float, float, float]:
+        local = now.astimezone(self.local_tz)
+        hour = local.hour + local.minute / 60 + local.second / 3600
+        pv = max(0.0, self.PV_PEAK_W * math.sin(math.pi * (hour - 6) / 14)) if 6 <= hour <= 20 else 0.0
+        surplus = pv - self.LOAD_W
+        if surplus > 0 and self.soc < 100:
+            battery = min(surplus, self.BATTERY_MAX_W)
+        elif surplus < 0 and self.soc > 10:
+            battery = max(surplus, -self.BATTERY_MAX_W)
+        else:
+            battery = 0.0
+        return pv, battery, surplus - battery
+
+    def update(self) -> None:
+        now = self.clock.now(UTC)
+        if self.last is None:
+            self.last = now
+        while self.last < now:
+            step_end = min(now, self.last + self.STEP)
+            self.integrate(step_end=step_end, hours=(step_end - self.last).total_seconds() / 3600)
+            self.last = step_end
+        self.start_day(now)
+        pv, battery, grid = self.power(now)
+        phase = grid / 3
+        self.values = {
+            'model': 'SUN2000-5KTL-M1', 'sn': 'SOAK000000001', 'pn': '01074000', 'firmware_version': 'V100R001C00SPC100',
+            'software_version': 'V100R001C00SPC125', 'protocol_version': 0, 'model_id': 428,
+            'rated_power': 5000, 'maximum_active_power': 5500, 'maximum_apparent_power': 5.5,
+            'state1': 0b10, 'state2': 0b110, 'state3': 0,
+            'peak_active_power_of_current_day': int(pv), 'active_power': int(pv - battery), 'input_power': int(pv),
+            'reactive_power': 0.0, 'power_factor': 1.0, 'grid_frequency': 50.0, 'efficiency': 98.5,
+            'internal_temperature': 40.0, 'device_status': 512,
+            'accumulated_energy_yield': self.counters['pv'], 'daily_energy_yield': self.counters['pv_day'],
+            'battery_running_status': 2, 'battery_working_mode_settings': 2, 'battery_charge_discharge_power': int(battery),
+            'battery_rated_capacity': int(self.BATTERY_CAPACITY_WH), 'battery_soc': self.soc, 'battery_backup_power_soc': 15.0,
+            'battery_unit1_battery_temperature': 25.0,
+            'battery_total_charge': self.counters['charge'], 'battery_total_discharge': self.counters['discharge'],
+            'battery_current_day_charge_capacity': self.counters['charge_day'], 'battery_current_day_discharge_capacity': self.counters['discharge_day'],
+            'meter_status': 1, 'meter_a_phase_voltage': 230.0, 'meter_b_phase_voltage': 231.0, 'meter_c_phase_voltage': 229.0,
+            'meter_a_phase_current': abs(phase) / 230, 'meter_b_phase_current': abs(phase) / 231, 'meter_c_phase_current': abs(phase) / 229,
+            'meter_active_power': int(grid), 'meter_reactive_power': 0, 'meter_power_factor': 1.0, 'meter_grid_frequency': 50.0,
+            'meter_positive_active_electricity': self.counters['feed_in'], 'meter_reverse_active_power': self.counters['from_grid'],
+            'meter_meter_type': 1, 'meter_a_phase_active_power': int(phase), 'meter_b_phase_active_power': int(phase), 'meter_c_phase_active_power': int(phase),
+        }
+
+    def start_day(self, now:datetime) -> None:
+        local_day = now.astimezone(self.local_tz).date()
+        if self.day != local_day:
+            self.day = local_day
+            for name in ('pv_day', 'charge_day', 'discharge_day'):
+                self.counters[name] = 0.0
+
+    def integrate(self, step_end:datetime, hours:float) -> None:
+        self.start_day(step_end)
+        pv, battery, grid = self.power(step_end)
+        self.counters['pv'] += pv * hours / 1000
+        self.counters['pv_day'] += pv * hours / 1000
+        self.counters['feed_in'] += max(grid, 0) * hours / 1000
+        self.counters['from_grid'] += max(-grid, 0) * hours / 1000
+        for name, energy in (('charge', max(battery, 0)), ('discharge', max(-battery, 0))):
+            self.counters[name] += energy * hours / 1000
+            self.counters[f'{name}_day'] += energy * hours / 1000
+        self.soc = min(100.0, max(0.0, self.soc + battery * hours / self.BATTERY_CAPACITY_WH * 100))
+
+    def registers(self) -> Dict[int, int]:
+        words = {}
+        for name, value in self.values.items():
+            descriptor = REGISTER_MAP[name]
+            if descriptor.column_type == ColumnType.STRING:
+                raw = value.encode().ljust(descriptor.length * 2, b'\0')
+            else:
+                raw = struct.pack(f'>{descriptor.struct_code}', int(round(value * (descriptor.gain or 1))))
+            for i in range(descriptor.length):
+                words[descriptor.address + i] = int.from_bytes(raw[2 * i:2 * i + 2], 'big')
+        return words
+
+
+def start_simulated_inverter(plant:SimulatedPlant, poll_times:List[datetime]) -> int:
+    from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+    from pymodbus.server import StartAsyncTcpServer
+
+    first_block_address = min(d.address for d in REGISTER_MAP.values())
+
+    class PlantBlock(ModbusSequentialDataBlock):
+        def __init__(self):
+            super().__init__(0, [0])
+
+        def validate(self, address, count=1):
+            return True
+
+        def getValues(self, address, count=1):
+            if address == first_block_address:
+                # every regular poll cycle starts with the lowest register block
+                poll_times.append(plant.clock.now(UTC))
+            plant.update()
+            words = plant.registers()
+            return [words.get(a, 0) for a in range(address, address + count)]
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    context = ModbusServerContext(slaves=ModbusSlaveContext(hr=PlantBlock(), zero_mode=True), single=True)
+    threading.Thread(target=lambda: asyncio.run(StartAsyncTcpServer(context=context, address=('127.0.0.1', port))), name='simulated-inverter', daemon=True).start()
+    for _ in range(50):
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return port
+        time.sleep(0.1)
+    raise RuntimeError('simulated inverter did not start')
+
+
+# --- checks -------------------------------------------------------------------------------
+
+def local_day_bounds_utc(day:date, local_tz) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, datetime.min.time(), tzinfo=local_tz).astimezone(UTC)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=local_tz).astimezone(UTC)
+    return start, end
+
+
+def check_rollups(client, config, local_tz, days:List[date]) -> List[str]:
+    failures = []
+    for day in days:
+        try:
+            failures += check_rollup_day(client=client, config=config, local_tz=local_tz, day=day)
+        except InfluxDB3ClientQueryError as e:
+            failures.append(f'{day}: {e.message}')
+    return failures
+
+
+def check_rollup_day(client, config, local_tz, day:date) -> List[str]:
+    failures = []
+    daily = config.influxdb_dbname_daily
+    start, end = local_day_bounds_utc(day, local_tz)
+    expected = client.query(f"""
+        SELECT
+          MAX(accumulated_energy_yield) - MIN(accumulated_energy_yield) AS pv_energy,
+          MAX(meter_reverse_active_power) - MIN(meter_reverse_active_power) AS house_from_grid,
+          MAX(meter_positive_active_electricity) - MIN(meter_positive_active_electricity) AS feed_in,
+          MAX(battery_total_charge) - MIN(battery_total_charge) AS battery_charge_kwh,
+          MAX(battery_total_discharge) - MIN(battery_total_discharge) AS battery_discharge_kwh
+        FROM {config.influxdb_table}
+        WHERE time >= TIMESTAMP '{start.isoformat()}' AND time < TIMESTAMP '{end.isoformat()}'
+        """).to_pylist()[0]
+
+    energy = client.query(f"""
+        SELECT pv_energy, house_from_grid, feed_in FROM {daily}
+        WHERE rollup = 'energy_breakdown' AND time = TIMESTAMP '{end.isoformat()}'
+        """).to_pylist()
+    if len(energy) != 1:
+        failures.append(f'{day}: expected 1 energy_breakdown rollup row at {end.isoformat()}, found {len(energy)}')
+    else:
+        for name in ('pv_energy', 'house_from_grid', 'feed_in'):
+            if not math.isclose(energy[0][name], expected[name] or 0.0, abs_tol=1e-6):
+                failures.append(f'{day}: energy_breakdown {name} {energy[0][name]:.3f} != {expected[name]:.3f} from telemetry')
+
+    # a day without telemetry (the monitor was down all day) gets a zero energy breakdown but no battery rollup
+    has_telemetry = expected['battery_charge_kwh'] is not None
+    battery = client.query(f"""
+        SELECT battery_charge_kwh, battery_discharge_kwh FROM {daily}
+        WHERE rollup = 'battery' AND day = '{day.isoformat()}' AND time = TIMESTAMP '{end.isoformat()}'
+        """).to_pylist()
+    if not has_telemetry:
+        if battery:
+            failures.append(f'{day}: expected no battery rollup row for a day without telemetry, found {len(battery)}')
+    elif len(battery) != 1:
+        failures.append(f'{day}: expected 1 battery rollup row at {end.isoformat()}, found {len(battery)}')
+    else:
+        for name in ('battery_charge_kwh', 'battery_discharge_kwh'):
+            if not math.isclose(battery[0][name], expected[name], abs_tol=1e-6):
+                failures.append(f'{day}: battery {name} {battery[0][name]:.3f} != {expected[name]:.3f} from telemetry')
+
+    for rollup_type in ROLLUP_TYPES:
+        expected_rows = 1 if has_telemetry or rollup_type == 'energy_breakdown' else 0
+        state = client.query(f"""
+            SELECT rollup_{rollup_type} FROM {config.influxdb_dbname_rollup_state}
+            WHERE rollup_{rollup_type} = TIMESTAMP '{datetime.combine(day, datetime.min.time(), local_tz).isoformat()}'
+            """)
+        if state.num_rows != expected_rows:
+            failures.append(f'{day}: expected {expected_rows} {rollup_type} rollup state row, found {state.num_rows}')
+    return failures
+
+
+def jitter_stats(poll_times:List[datetime], interval:int, local_tz, outage:Union[Tuple[datetime, datetime], None]) -> Dict[str, Dict[str, float]]:
+    window, elsewhere = [], []
+    for previous, current in zip(poll_times, poll_times[1:]):
+        if outage and previous < outage[1] <= current:
+            continue
+        jitter = (current - previous).total_seconds() - interval
+        local = previous.astimezone(local_tz).time()
+        in_window = local >= MIDNIGHT_WINDOW[0] or local < MIDNIGHT_WINDOW[1]
+        (window if in_window else elsewhere).append(jitter)
+
+    def summary(values):
+        if not values:
+            return {'cycles': 0}
+        ordered = sorted(values)
+        return {
+            'cycles': len(values),
+            'p50_seconds': round(statistics.median(ordered), 4),
+            'p99_seconds': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 4),
+            'max_seconds': round(ordered[-1], 4),
+        }
+    return {'midnight_window': summary(window), 'elsewhere': summary(elsewhere)}
+
+
+# --- harness --------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Accelerated-clock end-to-end soak test of the monitor.')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2026, 3, 23), help='first simulated local day (default 2026-03-23, spans the spring DST change)')
+    parser.add_argument('--days', type=int, default=14, help='simulated days (default 14)')
+    parser.add_argument('--interval', type=int, default=60, help='polling interval in simulated seconds (default 60)')
+    parser.add_argument('--stall-minutes', type=int, default=15, help='InfluxDB holds writes from this many minutes before midnight until just past the rollout time, so rollups start with a sink backlog (default 15)')
+    parser.add_argument('--outage-hours', type=float, default=48, help='the monitor is down from noon of the second simulated day for this many hours, so the rollups of the missed days are caught up when it comes back; 0 disables (default 48)')
+    parser.add_argument('--max-jitter-seconds', type=float, default=2.0, help='allowed poll delay in the midnight rollup window (default 2)')
+    parser.add_argument('--max-rss-growth-mib', type=float, default=16.0, help='allowed RSS growth after the first simulated day (default 16)')
+    parser.add_argument('--report', help='write the results as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help='keep the monitor INFO logs')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    receiver, sender = ctx.Pipe(duplex=False)
+    influx_process = ctx.Process(target=serve_fake_influxdb, args=(sender,), daemon=True)
+    influx_process.start()
+    http_port, flight_port = receiver.recv()
+
+    import main as monitor
+    from influxdb_client_3 import InfluxDBClient3
+    from config import get_config
+    from influxdb import InfluxDBHandler
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+    local_tz = monitor.LOCAL_TZ
+    start = datetime.combine(args.start, datetime.min.time(), tzinfo=local_tz).astimezone(UTC)
+    end = datetime.combine(args.start + timedelta(days=args.days), dt_time(0, 30), tzinfo=local_tz).astimezone(UTC)
+    clock = SimulatedClock(start=start, end=end)
+    outage = None
+    if args.outage_hours:
+        outage_start = datetime.combine(args.start + timedelta(days=1), dt_time(12), tzinfo=local_tz).astimezone(UTC)
+        outage = (outage_start, outage_start + timedelta(hours=args.outage_hours))
+        if outage[1] > end - timedelta(days=1):
+            parser.error('the outage must end at least a day before the simulation; use more --days or fewer --outage-hours')
+    plant = SimulatedPlant(clock=clock, local_tz=local_tz)
+    poll_times: List[datetime] = []
+    inverter_port = start_simulated_inverter(plant=plant, poll_times=poll_times)
+
+    os.environ.update({
+        'INFLUXDB_TOKEN': 'soak', 'INFLUXDB_HOST': '127.0.0.1', 'INFLUXDB_PORT': str(http_port), 'INFLUXDB_QUERY_PORT': str(flight_port),
+        'INFLUXDB_DBNAME': SOAK_DBNAME, 'SUN2000_INVERTER_HOST': '127.0.0.1', 'SUN2000_INVERTER_PORT': str(inverter_port),
+        'POLLING_INTERVAL_SECONDS': str(args.interval), 'CONTROL_PORT': '0', 'MQTT_HOST': '', 'FILE_SINK_PATH': '',
+    })
+    config = get_config()
+
+    # an existing installation: rollups are done up to the day before the simulation starts
+    monitor.CLOCK = clock
+    handler = InfluxDBHandler(config=config)
+    for rollup_type in ROLLUP_TYPES:
+        monitor.write_rollup_state(influxdb_handler=handler, day_local=args.start - timedelta(days=1), rollup_type=rollup_type)
+
+    # keep hold of the monitor's sink pipeline, so the harness can tell when the InfluxDB sink has caught up
+    pipelines = []
+    build_pipeline = monitor.build_pipeline
+
+    def keep_pipeline(**kwargs):
+        pipelines.append(build_pipeline(**kwargs))
+        return pipelines[-1]
+    monitor.build_pipeline = keep_pipeline
+
+    rollout = dt_time(monitor.ROLLOUT_HOUR_LOCAL, monitor.ROLLOUT_MINUTE_LOCAL)
+    stalled = False
+
+    def stall_around_midnight():
+        # simulated time runs far ahead of the sink worker: outside the stall window each step waits
+        # for the telemetry to be written, inside it writes are held and the InfluxDB sink falls behind
+        nonlocal stalled
+        local = clock.now(local_tz)
+        stall = local.time() > (datetime.combine(local.date(), dt_time(0)) - timedelta(minutes=args.stall_minutes)).time() \
+            or local.time() <= rollout
+        if stall != stalled:
+            stalled = stall
+            urllib.request.urlopen(urllib.request.Request(f'http://127.0.0.1:{http_port}/_soak/stall?on={int(stall)}', method='POST')).close()
+        deadline = time.monotonic() + 30
+        influxdb_worker = pipelines[0].worker(InfluxDBSink.name)
+        while not stalled and not influxdb_worker.drained() and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def skip_outage():
+        # the monitor host is down: no polling, no writes and no rollups until it comes back
+        if outage and outage[0] <= clock.now(UTC) < outage[1]:
+            logger.info(f'Outage from {outage[0].astimezone(local_tz)} to {outage[1].astimezone(local_tz)}')
+            clock.skip_to(outage[1])
+
+    rss_samples: List[Tuple[datetime, int]] = []
+
+    def sample_rss():
+        now = clock.now(UTC)
+        if not rss_samples or now - rss_samples[-1][0] >= timedelta(hours=1):
+            rss_samples.append((now, rss_kib() or 0))
+            if now.astimezone(local_tz).hour == 0:
+                logger.info(f'{now.astimezone(local_tz).date()}: {len(poll_times)} cycles, RSS {rss_samples[-1][1] / 1024:.1f} MiB')
+
+    clock.hooks = [skip_outage, stall_around_midnight, sample_rss]
+    logger.info(f'Soak: {args.days} days from {args.start} ({local_tz}), polling every {args.interval} s')
+    started = time.monotonic()
+    try:
+        monitor.main()
+    except SoakFinished:
+        pass
+    elapsed = time.monotonic() - started
+
+    client = InfluxDBClient3(host=f'http://127.0.0.1:{http_port}', token='soak', database=SOAK_DBNAME, query_port_overwrite=flight_port)
+    failures = []
+    with urllib.request.urlopen(f'http://127.0.0.1:{http_port}/_soak/stats') as r:
+        rejected = json.load(r)['rejected']
+    failures += [f'write rejected: {e}' for e in rejected[:10]]
+
+    # from the actual local days, as a DST change makes one of them 23 or 25 hours long
+    polled_seconds = (local_day_bounds_utc(args.start + timedelta(days=args.days - 1), local_tz)[1] - start).total_seconds()
+    if outage:
+        polled_seconds -= (outage[1] - outage[0]).total_seconds()
+    expected_cycles = int(polled_seconds // args.interval)
+    if len(poll_times) < expected_cycles * 0.99:
+        failures.append(f'only {len(poll_times)} poll cycles, expected about {expected_cycles}')
+
+    # the simulation ends at 00:30 after the last day, so every simulated day is complete and rolled up,
+    # including the days missed during the outage
+    days = [args.start + timedelta(days=i) for i in range(args.days)]
+    failures += check_rollups(client=client, config=config, local_tz=local_tz, days=days)
+
+    jitter = jitter_stats(poll_times=poll_times, interval=args.interval, local_tz=local_tz, outage=outage)
+    window_max = jitter['midnight_window'].get('max_seconds', 0)
+    if window_max > args.max_jitter_seconds:
+        failures.append(f'poll delayed by {window_max:.3f} s in the midnight rollup window (limit {args.max_jitter_seconds} s)')
+
+    baseline = next((rss for t, rss in rss_samples if t >= start + timedelta(days=1)), None)
+    rss_growth_mib = (rss_samples[-1][1] - baseline) / 1024 if baseline else 0.0
+    if rss_growth_mib > args.max_rss_growth_mib:
+        failures.append(f'RSS grew by {rss_growth_mib:.1f} MiB after the first day (limit {args.max_rss_growth_mib} MiB)')
+
+    report = {
+        'simulated_days': args.days,
+        'real_seconds': round(elapsed, 1),
+        'poll_cycles': len(poll_times),
+        'rollup_days_checked': len(days),
+        'outage': [t.astimezone(local_tz).isoformat() for t in outage] if outage else None,
+        'jitter': jitter,
+        'rss_mib': {'after_first_day': round(baseline / 1024, 1) if baseline else None, 'end': round(rss_samples[-1][1] / 1024, 1), 'growth': round(rss_growth_mib, 1)},
+        'failures': failures,
+    }
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    influx_process.terminate()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,32 @@
 import logging
-from dataclasses import dataclass
-from typing import Union, Dict
+from typing import Union, Dict, List, NamedTuple, Set
 
 from sun2000_modbus import inverter
-from sun2000_modbus import registers
 
 from config import MonitorConfig
+from register_map import REGISTER_MAP, RegisterBlock, plan_blocks
 
 logger = logging.getLogger(__name__)
 
-@dataclass()
-class RegisterData:
+class RegisterData(NamedTuple):
     source: str
     value: Union[str, int, float, None]
 
 class Sun2000NotConnectedError(Exception):
     pass
 
+class Sun2000ShortReadError(Exception):
+    pass
+
+class KnownFailureFilter(logging.Filter):
+    """Drops pymodbus' per-request 'Exception response' errors while a block already known to fail is read."""
+    def __init__(self)->None:
+        super().__init__()
+        self.active = False
+
+    def filter(self, record:logging.LogRecord)->bool:
+        return not (self.active and record.getMessage().startswith('Exception response'))
+
 class Sun2000:
     def __init__(self, config:MonitorConfig)->None:
         self.config = config
@@ -71,309 +81,57 @@ class Sun2000:
             "meter_b_phase_active_power",
             "meter_c_phase_active_power",
         ]
+        self.blocks = plan_blocks([REGISTER_MAP[name] for name in self.registers_to_poll])
+        # start addresses of the blocks currently failing, so each outage is warned about once
+        self.failing_blocks: Set[int] = set()
+        self.known_failure_filter = KnownFailureFilter()
+        logging.getLogger('pymodbus.logging').addFilter(self.known_failure_filter)
 
     def ping(self)->bool:
         self.inverter.connect()
         return self.inverter.isConnected()
 
-    def read_data(self, register:Union[registers.InverterEquipmentRegister, registers.BatteryEquipmentRegister, registers.MeterEquipmentRegister], read_formatted:bool=False)->Union[str, int, float, None]:
+    def _ensure_connected(self)->None:
         if not self.inverter.isConnected():
             self.inverter.connect()
+
+    def read_block(self, block:RegisterBlock)->Dict[str, Union[str, int, float, None]]:
+        self._ensure_connected()
         try:
-            if read_formatted:
-                data = self.inverter.read_formatted(register=register)
-            else:
-                data = self.inverter.read(register=register)
+            raw = self.inverter.read_range(start_address=block.start, quantity=block.quantity)
         except ValueError as e:
             if 'Inverter is not connected' in str(e):
                 raise Sun2000NotConnectedError from e
-        return data
-
-    def poll_all(self):
-        return dict([(register, getattr(self, register)) for register in self.registers_to_poll])
-
-    @property
-    def model(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.Model))
-
-    @property
-    def sn(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.SN))
-
-    @property
-    def pn(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.PN))
-
-    @property
-    def firmware_version(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.FirmwareVersion))
-
-    @property
-    def software_version(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.SoftwareVersion))
-
-    @property
-    def protocol_version(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.ProtocolVersion))
-
-    @property
-    def model_id(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.ModelID))
-
-    @property
-    def rated_power(self, source='inverter')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.RatedPower))
-
-    @property
-    def maximum_active_power(self, source='inverter')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.MaximumActivePower))
-
-    @property
-    def maximum_apparent_power(self, source='inverter')->RegisterData:
-        # kVA
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.MaximumApparentPower))
-
-    @property
-    def state1(self, source='inverter')->RegisterData:
-        state1_int = int(self.read_data(registers.InverterEquipmentRegister.State1), 2)
-        if state1_int & (1 << 6):
-            return RegisterData(source, '6')  # Fault
-        if state1_int & (1 << 8):
-            return RegisterData(source, '8')  # Shutdown
-        if state1_int & (1 << 3) or state1_int & (1 << 4):
-            return RegisterData(source, '4')  # Derating
-        if state1_int & (1 << 1):
-            return RegisterData(source, '2')  # Grid connected
-        if state1_int & (1 << 0):
-            return RegisterData(source, '1')  # Standby
-        return RegisterData(source, '0')  # Unknown
-
-    @property
-    def state2(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.State2))
-
-    @property
-    def state3(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.State3))
-
-    @property
-    def peak_active_power_of_current_day(self, source='inverter')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.PeakActivePowerOfCurrentDay))
-
-    @property
-    def active_power(self, source='inverter')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.ActivePower))
-
-    @property
-    def input_power(self, source='inverter')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.InputPower))
-
-    @property
-    def reactive_power(self, source='inverter')->RegisterData:
-        # kvar
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.ReactivePower))
-
-    @property
-    def power_factor(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.PowerFactor))
-
-    @property
-    def grid_frequency(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.GridFrequency))
-
-    @property
-    def efficiency(self, source='inverter')->RegisterData:
-        # %
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.Efficiency))
-
-    @property
-    def internal_temperature(self, source='inverter')->RegisterData:
-        # C
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.InternalTemperature))
-
-    @property
-    def device_status(self, source='inverter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.DeviceStatus))
-
-    @property
-    def accumulated_energy_yield(self, source='inverter') -> RegisterData:
-        # kWh
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.AccumulatedEnergyYield))
-
-    @property
-    def daily_energy_yield(self, source='inverter') -> RegisterData:
-        return RegisterData(source, self.read_data(registers.InverterEquipmentRegister.DailyEnergyYield))
-
-    @property
-    def battery_running_status(self, source='battery')->RegisterData:
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.RunningStatus))
-
-    @property
-    def battery_working_mode_settings(self, source='battery')->RegisterData:
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.WorkingModeSettings))
-
-    @property
-    def battery_charge_discharge_power(self, source='battery')->RegisterData:
-        # W
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.ChargeDischargePower))
-
-    @property
-    def battery_rated_capacity(self, source='battery')->RegisterData:
-        # Wh
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.RatedCapacity))
-
-    @property
-    def battery_soc(self, source='battery')->RegisterData:
-        # %
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.SOC))
-
-    @property
-    def battery_backup_power_soc(self, source='battery')->RegisterData:
-        # %
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.BackupPowerSOC))
-
-    @property
-    def battery_unit1_battery_temperature(self, source='battery')->RegisterData:
-        # C
-        data = self.read_data(registers.BatteryEquipmentRegister.Unit1BatteryTemperature)
-        if int(data) > 100:
-            logger.warning(f'Battery unit 1 temperature reading seems invalid: {data}')
-            return RegisterData(source, None)
-        return RegisterData(source, data)
-
-    @property
-    def battery_total_charge(self, source='battery')->RegisterData:
-        # kWh
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.TotalCharge))
-
-    @property
-    def battery_total_discharge(self, source='battery')->RegisterData:
-        # kWh
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.TotalDischarge))
-
-    @property
-    def battery_current_day_charge_capacity(self, source='battery')->RegisterData:
-        # kWh
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.CurrentDayChargeCapacity))
-
-    @property
-    def battery_current_day_discharge_capacity(self, source='battery')->RegisterData:
-        # kWh
-        return RegisterData(source, self.read_data(registers.BatteryEquipmentRegister.CurrentDayDischargeCapacity))
-
-    @property
-    def meter_status(self, source='meter')->RegisterData:
-        """
-        0: offline
-        1: normal
-        """
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.MeterStatus))
-
-    @property
-    def meter_a_phase_voltage(self, source='meter')->RegisterData:
-        # V
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.APhaseVoltage))
-
-    @property
-    def meter_b_phase_voltage(self, source='meter')->RegisterData:
-        # V
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.BPhaseVoltage))
-
-    @property
-    def meter_c_phase_voltage(self, source='meter')->RegisterData:
-        # V
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.CPhaseVoltage))
-
-    @property
-    def meter_a_phase_current(self, source='meter')->RegisterData:
-        # A
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.APhaseCurrent))
-
-    @property
-    def meter_b_phase_current(self, source='meter')->RegisterData:
-        # A
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.BPhaseCurrent))
-
-    @property
-    def meter_c_phase_current(self, source='meter')->RegisterData:
-        # A
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.CPhaseCurrent))
-
-    @property
-    def meter_active_power(self, source='meter')->RegisterData:
-        """
-        >0: feed-in to the power grid.
-        <0: supply from the power grid.
-        """
-        # W
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.ActivePower))
-
-    @property
-    def meter_reactive_power(self, source='meter')->RegisterData:
-        # var
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.ReactivePower))
-
-    @property
-    def meter_power_factor(self, source='meter')->RegisterData:
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.PowerFactor))
-
-    @property
-    def meter_grid_frequency(self, source='meter')->RegisterData:
-        # Hz
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.GridFrequency))
-
-    @property
-    def meter_positive_active_electricity(self, source='meter')->RegisterData:
-        """
-        Electricity fed by the inverter to the power grid.
-        """
-        # kWh
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.PositiveActiveElectricity))
-
-    @property
-    def meter_reverse_active_power(self, source='meter')->RegisterData:
-        """
-        Power supplied to a distributed system from the power grid.
-        """
-        # kWh
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.ReverseActivePower))
-
-    @property
-    def meter_meter_type(self, source='meter')->RegisterData:
-        """
-        0: single phase.
-        1: three phase.
-        """
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.MeterType))
-
-    @property
-    def meter_a_phase_active_power(self, source='meter')->RegisterData:
-        """
-        > 0: feed-in to the power grid.
-        <0: supply from the power grid
-        """
-        # W
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.APhaseActivePower))
-
-    @property
-    def meter_b_phase_active_power(self, source='meter')->RegisterData:
-        """
-        > 0: feed-in to the power grid.
-        <0: supply from the power grid
-        """
-        # W
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.BPhaseActivePower))
-
-    @property
-    def meter_c_phase_active_power(self, source='meter')->RegisterData:
-        """
-        > 0: feed-in to the power grid.
-        <0: supply from the power grid
-        """
-        # W
-        return RegisterData(source, self.read_data(registers.MeterEquipmentRegister.CPhaseActivePower))
+            raise
+        if len(raw) != block.layout.size:
+            raise Sun2000ShortReadError(f'Short read for registers {block.start}-{block.start + block.quantity - 1}: got {len(raw)} bytes, expected {block.layout.size}')
+        return block.decode(raw)
+
+    def poll(self, blocks:List[RegisterBlock])->Dict[str, RegisterData]:
+        """
+        Read the blocks in turn. A block the inverter answers with an exception (eg. no battery
+        or meter attached) is left out and the other blocks are still returned. It is warned
+        about when it starts failing; repeats are logged at debug level until it recovers.
+        """
+        values = {}
+        for block in blocks:
+            self.known_failure_filter.active = block.start in self.failing_blocks
+            try:
+                values.update(self.read_block(block))
+            except Sun2000ShortReadError as e:
+                message = f'{e}; skipping {", ".join(d.name for d in block.descriptors)}'
+                if block.start in self.failing_blocks:
+                    logger.debug(message)
+                else:
+                    self.failing_blocks.add(block.start)
+                    logger.warning(f'{message} until it can be read again')
+                continue
+            if block.start in self.failing_blocks:
+                self.failing_blocks.discard(block.start)
+                logger.info(f'Registers {block.start}-{block.start + block.quantity - 1} can be read again')
+        self.known_failure_filter.active = False
+        return {name: RegisterData(REGISTER_MAP[name].source, value) for name, value in values.items()}
+
+    def poll_all(self)->Dict[str, RegisterData]:
+        polled = self.poll(self.blocks)
+        return {name: polled[name] for name in self.registers_to_poll if name in polled}